@@ -33,7 +33,7 @@ if [[ $TMUX ]]; then
   run "./venv/bin/python3 manage.py runserver"
   splitH
   run "source .env"
-  run "./venv/bin/python3 manage.py robust_worker --beat"
+  run "./venv/bin/python3 manage.py robust_lane_worker --beat --concurrency 4 --reserve auth=1 --bulk 20"
 
 else
   tmux new-session $0
@@ -1,13 +1,19 @@
 import os
+import re
 import sys
 import json
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import trafaret as t
 
 
 __all__ = ('raw_environ', 'environ')
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENV_FILE = '.env'
+SNAPSHOT_FILE = '.env.snapshot.json'
+
 
 def make_list(val: str) -> Iterable[str]:
     return val.split(',')
@@ -38,23 +44,228 @@ env_t = t.Dict({
 }).ignore_extra('*')
 
 
-try:
-    environ = env_t.check_and_return(os.environ)
-    raw_environ = {}
+class EnvSyntaxError(ValueError):
+    pass
+
+
+ASSIGN_RE = re.compile(r'^(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(.*)$')
+SOURCE_RE = re.compile(r'^(?:source|\.)\s+(\S+)$')
+IF_FILE_RE = re.compile(r'^if\s+\[\[?\s+-f\s+(\S+)\s+\]\]?\s*;\s*then$')
+VAR_RE = re.compile(r'\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))')
+
+
+def expand(value: str, lookup: Dict[str, str], quoted: bool = False) -> str:
+    """
+    substitute $NAME and ${NAME} and resolve backslash escapes in one left to right pass,
+    inside double quotes {quoted} only $, `, double quote and backslash can be escaped,
+    substituted values are taken as they are
+    """
+    result = []
+    pos = 0
+    while pos < len(value):
+        char = value[pos]
+        if char == '\\' and pos + 1 < len(value):
+            following = value[pos + 1]
+            if not quoted or following in '$`"\\':
+                result.append(following)
+                pos += 2
+                continue
+        elif char == '$':
+            match = VAR_RE.match(value, pos)
+            if not match:
+                raise EnvSyntaxError('unsupported expansion in {!r}'.format(value))
+            result.append(lookup.get(match.group(1) or match.group(2), ''))
+            pos = match.end()
+            continue
+        elif char == '`':
+            raise EnvSyntaxError('unsupported command substitution in {!r}'.format(value))
+        result.append(char)
+        pos += 1
+    return ''.join(result)
+
+
+def parse_value(value: str, lookup: Dict[str, str]) -> str:
+    """
+    bash word: 'literal', "expanded", or a bare expanded word, optionally followed by a # comment
+    """
+    result = []
+    pos = 0
+    while pos < len(value):
+        char = value[pos]
+        if char == "'":
+            end = value.find("'", pos + 1)
+            if end < 0:
+                raise EnvSyntaxError('unterminated quote in {!r}'.format(value))
+            result.append(value[pos + 1:end])
+            pos = end + 1
+        elif char == '"':
+            end = pos + 1
+            while end < len(value) and value[end] != '"':
+                end += 2 if value[end] == '\\' else 1
+            if end >= len(value):
+                raise EnvSyntaxError('unterminated quote in {!r}'.format(value))
+            result.append(expand(value[pos + 1:end], lookup, quoted=True))
+            pos = end + 1
+        elif char.isspace():
+            if value[pos:].strip() and not value[pos:].strip().startswith('#'):
+                raise EnvSyntaxError('unexpected {!r}'.format(value[pos:].strip()))
+            break
+        else:
+            end = pos
+            while end < len(value) and value[end] not in '\'"' and not value[end].isspace():
+                end += 2 if value[end] == '\\' else 1
+            end = min(end, len(value))
+            result.append(expand(value[pos:end], lookup))
+            pos = end
+    return ''.join(result)
+
+
+def parse_env_file(path: str, values: Dict[str, str], files: List[str]) -> None:
+    """
+    read the `export KEY=value` subset of bash used by .env files into {values},
+    `source` and `if [[ -f file ]]; then ... fi` are followed, {files} collects every file looked at
+    """
+    files.append(path)
+    if not os.path.exists(path):
+        return
+
+    base = os.path.dirname(path)
+    lookup = dict(os.environ)
+    lookup.update(values)
+    conditions = []  # type: List[bool]
+
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            match = IF_FILE_RE.match(line)
+            if match:
+                condition_path = os.path.join(base, match.group(1))
+                files.append(condition_path)
+                conditions.append(os.path.exists(condition_path))
+                continue
+            if line == 'fi':
+                if not conditions:
+                    raise EnvSyntaxError('{}:{}: unexpected fi'.format(path, number))
+                conditions.pop()
+                continue
+            if not all(conditions):
+                continue
+
+            match = SOURCE_RE.match(line)
+            if match:
+                parse_env_file(os.path.join(base, match.group(1)), values, files)
+                lookup.update(values)
+                continue
+
+            match = ASSIGN_RE.match(line)
+            if not match:
+                raise EnvSyntaxError('{}:{}: unsupported line {!r}'.format(path, number, line))
+            try:
+                values[match.group(1)] = lookup[match.group(1)] = parse_value(match.group(2), lookup)
+            except EnvSyntaxError as e:
+                raise EnvSyntaxError('{}:{}: {}'.format(path, number, e))
+
+    if conditions:
+        raise EnvSyntaxError('{}: missing fi'.format(path))
+
+
+def read_env(base_dir: str = BASE_DIR) -> Tuple[Dict[str, str], List[str]]:
+    values = {}  # type: Dict[str, str]
+    files = []  # type: List[str]
+    parse_env_file(os.path.join(base_dir, ENV_FILE), values, files)
+    return values, files
+
+
+def fingerprint(files: Iterable[str]) -> Dict[str, Optional[List[int]]]:
+    result = {}  # type: Dict[str, Optional[List[int]]]
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            result[path] = None
+        else:
+            result[path] = [stat.st_mtime_ns, stat.st_size]
+    return result
+
+
+def check(source: Dict[str, str]) -> Tuple[dict, Dict[str, str]]:
+    try:
+        checked = env_t.check_and_return(source)
+    except t.DataError as err:
+        sys.stderr.write('\x1B[31;1mcheck following env errors:\x1B[m\n')
+        for key, err in err.as_dict().items():
+            sys.stderr.write('{}: {}\n'.format(key, err))
+        sys.exit(1)
+
+    raw = {}
     for key in env_t.keys_names():
-        if key in os.environ:
-            environ.setdefault(key, None)
-            raw_environ[key] = os.environ.get(key, None)
-
-except t.DataError as err:
-    sys.stderr.write('\x1B[31;1mcheck following env errors:\x1B[m\n')
-    for key, err in err.as_dict().items():
-        sys.stderr.write('{}: {}\n'.format(key, err))
+        if key in source:
+            checked.setdefault(key, None)
+            raw[key] = source.get(key, None)
+    return checked, raw
+
+
+def read_snapshot(base_dir: str = BASE_DIR) -> Optional[dict]:
+    """
+    the snapshot written by `env.py snapshot`, None if missing or any env file changed since
+    """
+    try:
+        with open(os.path.join(base_dir, SNAPSHOT_FILE), encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('files') != fingerprint(snapshot.get('files', ())):
+        return None
+    return snapshot
+
+
+def write_snapshot(base_dir: str = BASE_DIR) -> dict:
+    values, files = read_env(base_dir)
+    checked, raw = check(dict(os.environ, **values))
+    snapshot = {'files': fingerprint(files), 'environ': checked, 'raw': raw}
+    path = os.path.join(base_dir, SNAPSHOT_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return snapshot
+
+
+def load(base_dir: str = BASE_DIR) -> Tuple[dict, Dict[str, str]]:
+    """
+    the process environment when it is already set up (DOMAIN is defined),
+    otherwise the fresh snapshot or the parsed and validated .env files,
+    raw values are exported to os.environ either way
+    """
+    if 'DOMAIN' in os.environ:
+        return check(os.environ)
+
+    snapshot = read_snapshot(base_dir)
+    if snapshot is not None:
+        checked, raw = snapshot['environ'], snapshot['raw']
+    else:
+        values, _ = read_env(base_dir)
+        checked, raw = check(dict(os.environ, **values))
+
+    os.environ.update(raw)
+    return checked, raw
+
+
+try:
+    environ, raw_environ = load()
+except EnvSyntaxError as err:
+    sys.stderr.write('\x1B[31;1m{}\x1B[m\n'.format(err))
     sys.exit(1)
 
 
 if __name__ == '__main__':
     target = environ
+    if len(sys.argv) > 1 and sys.argv[1] == 'snapshot':
+        write_snapshot()
+        sys.stdout.write('{} written\n'.format(os.path.join(BASE_DIR, SNAPSHOT_FILE)))
+        sys.exit(0)
     if len(sys.argv) > 1 and sys.argv[1] == 'raw':
         target = raw_environ
     if len(sys.argv) > 2 and sys.argv[2] == 'export':
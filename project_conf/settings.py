@@ -1,16 +1,10 @@
-import json
 import os
-import subprocess
 from datetime import timedelta
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-if 'DOMAIN' not in os.environ:
-    export = subprocess.check_output(['bash', '-c', 'source .env && ./venv/bin/python project_conf/env.py raw'],
-                                     cwd=BASE_DIR)
-    for key, value in json.loads(export.decode('utf-8')).items():
-        os.environ[key] = value
-
+# reads .env/.local-env in process unless DOMAIN is already set,
+# `./venv/bin/python project_conf/env.py snapshot` at deploy time skips even that
 from .env import environ
 
 SECRET_KEY = 'zsutuls@j2m^^+q-9(05wh4u8*v0xw#x78l^kc(b0t6x#aplae'
@@ -47,10 +41,11 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'project_name.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.http.ConditionalGetMiddleware',
+    'project_name.middleware.HashingSaturatedMiddleware',
 ]
 
 ROOT_URLCONF = 'project_conf.urls'
@@ -72,6 +67,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'project_conf.wsgi.application'
 
+# request handling threads of project_conf.asgi.application, connections themselves are served by the event loop
+ASGI_THREADS = 16
+
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 DB = {
@@ -80,7 +78,6 @@ DB = {
     'NAME': environ['DATABASE_NAME'],
     'USER': environ['DATABASE_USER'],
     'PASSWORD': environ['DATABASE_PASSWORD'],
-    'ATOMIC_REQUESTS': True,
 }
 
 DATABASES = {
@@ -112,6 +109,43 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Authenticated user cache, enabled by a CACHE alias shared by every process: User post_save changes
+# the user version there and every process checks its local tier against it on each request
+
+USER_CACHE = {
+    'LOCAL_SIZE': 1000,
+    'LOCAL_TTL': 5,
+    'CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+# Password hashing runs off-thread in a bounded process pool
+
+PASSWORD_HASHING_SERVICE = {
+    'BACKEND': 'project_name.hashing.PoolHashingService',
+    'OPTIONS': {
+        'WORKERS': None,
+        'MAX_PENDING': None,
+        'TIMEOUT': 5,
+    },
+}
+
+# Rate limits, checked before any password hashing or DB work
+# {scope}:{key}: (max hits, period in seconds)
+
+RATELIMIT_SKIP = False
+RATELIMIT_CACHE = None
+RATELIMIT_IP_HEADER = None
+RATELIMIT_RULES = {
+    'signin:email': (10, 60),
+    'signin:ip': (100, 60),
+    'signup:ip': (20, 3600),
+    'reset_password:email': (5, 3600),
+    'reset_password:ip': (50, 3600),
+    'resend_email_confirm:email': (5, 3600),
+    'resend_email_confirm:ip': (50, 3600),
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.10/topics/i18n/
 
@@ -211,6 +245,8 @@ LOGGING = {
 # Emails
 
 EMAIL_CONFIRMATION = True
+EMAIL_CONFIRM_TOKEN_MAX_AGE = timedelta(days=7)
+PASSWORD_RESET_TOKEN_MAX_AGE = timedelta(days=1)
 EMAIL_SKIP = False
 EMAIL_EXCLUDE_LIST = environ['EMAIL_EXCLUDE_LIST']
 
@@ -224,13 +260,32 @@ if environ.get('EMAIL_BACKEND'):
 
 API_DEFAULT_ROUTER = 'project_name.api.router'
 
+# validate requests with the validators compiled from each ApiView spec, see project_name.schema
+API_COMPILED_SCHEMAS = True
+
 
 # Happymailer
 
-HAPPYMAILER_BACKEND = 'happymailer.backends.MjmlBackend'
+HAPPYMAILER_BACKEND = 'project_name.mjml_server.MjmlServerBackend'
 HAPPYMAILER_MJML_BIN = [os.path.join(BASE_DIR, './node_modules/.bin/mjml')]
+HAPPYMAILER_MJML_SERVER = {
+    'COMMAND': ['node', os.path.join(BASE_DIR, 'project_name', 'mjml_server.js')],
+    'PROCESSES': 2,
+    'CONCURRENCY': 8,
+    'TIMEOUT': 10,
+}
 HAPPYMAILER_FROM = None
 
+# Avatars
+
+AVATAR_FETCH = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_SIZE': 5 * 1024 * 1024,
+    'POOL_SIZE': 10,
+    'RETRY_DELAY': timedelta(minutes=1),
+}
+
 # Easy-Thumbnails
 
 AVATAR_ALIASES = {
@@ -244,6 +299,9 @@ THUMBNAIL_ALIASES = {
 
 THUMBNAIL_NAMER = 'easy_thumbnails.namers.source_hashed'
 
+# thumbnail jobs of a user requested within this window run once
+AVATAR_THUMBNAILS_DEBOUNCE = timedelta(seconds=10)
+
 
 # Django-Robust
 
@@ -255,11 +313,42 @@ ROBUST_NOTIFY_TIMEOUT = 10
 
 ROBUST_ALWAYS_EAGER = False
 
+# lanes by priority, see project_name.lanes and the robust_lane_worker command
+ROBUST_LANES = ['auth', 'default', 'bulk']
+
+# tasks a lane worker thread takes per transaction, mail tasks of a chunk share
+# one user query and one email connection, see project_name.mails.batch
+ROBUST_WORKER_BULK = 20
+
 ROBUST_SCHEDULE = [
     (timedelta(minutes=5), 'robust.utils.cleanup'),
 ]
 
 
+# Startup, see the benchmark_startup command
+
+# median cold start of each entry point, seconds
+STARTUP_BUDGET = {
+    'manage': 3.0,
+    'wsgi': 2.0,
+    'worker': 2.0,
+}
+
+# modules an entry point must not import until they are used
+STARTUP_LAZY_MODULES = {
+    'manage': ['requests'],
+    'wsgi': ['requests', 'project_name.avatars'],
+    'worker': ['requests', 'project_name.avatars', 'project_name.thumbnails'],
+}
+
+
+# Load test, see the benchmark_api command
+
+# stored results of the main branch and the allowed regression against them, a fraction
+LOADTEST_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'api.json')
+LOADTEST_THRESHOLD = 0.2
+
+
 # Debug Mode
 
 if DEBUG:
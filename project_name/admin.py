@@ -1,9 +1,14 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.utils.safestring import mark_safe
 
 from .models import User
+from .pagination import EstimatedCountPaginator
+from .search import search_users
 
 admin.site.unregister(Group)
 
@@ -34,6 +39,40 @@ class AvatarMixin:
         return mark_safe(html)
 
 
+class UserChangeList(ChangeList):
+    """
+    adds keyset navigation (?after=<date_joined>|<id>) over the default -date_joined ordering
+    """
+    CURSOR_VAR = 'after'
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(UserChangeList, self).get_filters_params(params)
+        lookup_params.pop(self.CURSOR_VAR, None)
+        return lookup_params
+
+    def uses_keyset(self, request):
+        return list(self.get_ordering(request, self.root_queryset)) == ['-date_joined', '-pk']
+
+    def get_queryset(self, request):
+        queryset = super(UserChangeList, self).get_queryset(request)
+        cursor = self.params.get(self.CURSOR_VAR)
+        if cursor and self.uses_keyset(request):
+            date_joined, _, pk = cursor.partition('|')
+            date_joined = parse_datetime(date_joined)
+            if date_joined and pk.isdigit():
+                queryset = queryset.filter(Q(date_joined__lt=date_joined) | Q(date_joined=date_joined, pk__lt=pk))
+        return queryset
+
+    def get_results(self, request):
+        super(UserChangeList, self).get_results(request)
+        self.next_url = None
+        results = list(self.result_list)
+        if self.uses_keyset(request) and len(results) >= self.list_per_page:
+            last = results[-1]
+            cursor = '{}|{}'.format(last.date_joined.isoformat(), last.pk)
+            self.next_url = self.get_query_string({self.CURSOR_VAR: cursor}, [PAGE_VAR])
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin, AvatarMixin):
     list_display = (
@@ -45,9 +84,17 @@ class UserAdmin(BaseUserAdmin, AvatarMixin):
         'id', 'last_login', 'date_joined', 'avatar_image', 'avatar_full',
     )
     ordering = ('-date_joined',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'email_confirmed', 'password')}),
         ('Personal info', {'fields': ('avatar_full', 'first_name', 'last_name',)}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
+
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        return search_users(queryset, search_term), False
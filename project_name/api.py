@@ -1,16 +1,16 @@
-import api.schema as s
 from api.exceptions import RequestParseError
-from api.spec import Spec, Response
 from api.views import ApiView, Method
 from api.router import Router
 from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
+from django.db import IntegrityError
 from django.db.models import Q
 from django.shortcuts import redirect
 
-from . import signals
-from .models import User
-from .utils import random_key
+from . import ratelimit, schema as s, signals, tokens, transaction
+from .models import EmailClaim, User
+from .schema import CompiledSpecMixin, Projection, Response, Spec, compile_views
+from .transaction import TransactionPolicyMixin
 import copy
 
 
@@ -21,6 +21,8 @@ Errors = s.Object(
     errors=s.Array(s.String()),
 )
 
+TOO_MANY_REQUESTS = 429, {'errors': ['Too many requests, please try again later']}
+
 
 UserDef = s.Definition('User', s.Object(
     id=s.Integer(),
@@ -30,11 +32,22 @@ UserDef = s.Definition('User', s.Object(
     avatar=s.Optional(s.String()),
 ))
 
+UserProjection = Projection(
+    UserDef,
+    id='pk',
+    short_name=lambda user: user.get_short_name(),
+    # only the stored URLs, resolving thumbnails is left to the avatar tasks
+    avatar=lambda user: (user.avatar_urls or {}).get('x300'),
+)
+
 
-class Signin(ApiView):
+class Signin(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     User signin
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 2  # user lookup, last_login
+
     spec = Spec(
         Method.POST,
         s.Object(
@@ -44,19 +57,19 @@ class Signin(ApiView):
         Response(200, schema=UserDef),
         Response(400, schema=Errors),
         Response(423),
+        Response(429, schema=Errors),
+        Response(503, schema=Errors, description='password hashing is saturated'),
     )
 
     def handle(self, data):
+        if ratelimit.exceeded(self.request, 'signin', email=data['email'].lower()):
+            return TOO_MANY_REQUESTS
+
         user = authenticate(username=data['email'], password=data['password'])
 
         if user and user.is_active and user.email_confirmed:
             login(self.request, user)
-            return {
-                'id': user.pk,
-                'email': user.email,
-                'first_name': user.first_name,
-                'short_name': user.get_short_name(),
-            }
+            return self.project(UserProjection, user)
 
         if user and (not user.email_confirmed or not user.is_active):
             return 423
@@ -64,10 +77,13 @@ class Signin(ApiView):
         return 400, {'errors': ['Email and/or password not recognized']}
 
 
-class Logout(ApiView):
+class Logout(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     User Logout
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 1  # user lookup
+
     spec = Spec(
         Method.POST,
         s.Empty,
@@ -79,10 +95,14 @@ class Logout(ApiView):
         return 204
 
 
-class Signup(ApiView):
+class Signup(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     User signup (Register)
     '''
+    # the password is hashed before User.save() opens its transaction for the user and email claim rows
+    transaction_policy = transaction.NONE
+    query_budget = 3  # user and email claim inserts, last_login without email confirmation
+
     spec = Spec(
         Method.POST,
         s.Object(
@@ -95,39 +115,45 @@ class Signup(ApiView):
         Response(202, description='user created, need to email confirmation'),
         Response(301, description='user created, redirect to the next page'),
         Response(400, schema=Errors),
+        Response(429, schema=Errors),
+        Response(503, schema=Errors, description='password hashing is saturated'),
     )
 
     def create_user(self, **kwargs):
-        confirm_code = kwargs.pop('email_confirm_code', random_key())
-        return User.objects.create_user(
-            email_confirm_code=confirm_code,
-            **kwargs,
-        )
+        return User.objects.create_user(**kwargs)
 
     def handle(self, data):
+        if ratelimit.exceeded(self.request, 'signup'):
+            return TOO_MANY_REQUESTS
+
         data = copy.copy(data)
         next = data.pop('next', None)
         data['email'] = data['email'].lower()
 
-        if User.objects.filter(Q(email=data['email']) | Q(new_email=data['email'])).exists():
-            return 400, {'errors': ['This email is already in use, please sign in']}
+        if not settings.EMAIL_CONFIRMATION:
+            data['email_confirmed'] = True
 
+        try:
+            user = self.create_user(**data)
+        except IntegrityError:
+            return 400, {'errors': ['This email is already in use, please sign in']}
 
         if settings.EMAIL_CONFIRMATION:
-            user = self.create_user(**data)
             signals.user_email_confirm.send(User, user=user, email=user.email, next=next)
             return 202
         else:
-            user = self.create_user(email_confirmed=True, **data)
             login(self.request, user)
             signals.signup_completed.send(User, user=user)
             return redirect(next or '/')
 
 
-class EmailConfirm(ApiView):
+class EmailConfirm(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Confirm user email
     '''
+    transaction_policy = transaction.BLOCK
+    query_budget = 5  # user lookup and update, last_login, email claim and release on email change
+
     spec = Spec(
         Method.GET,
         s.Query(
@@ -140,69 +166,79 @@ class EmailConfirm(ApiView):
 
     def handle(self, data):
         code = data['code']
-        user = User.objects.filter(pk=data['id']) \
-            .exclude(email=None, new_email=None) \
-            .filter(Q(email_confirm_code=code) | Q(new_email_confirm_code=code)) \
-            .first()
+        user = User.objects.filter(pk=data['id']).first()
 
         if user:
-            if user.email_confirm_code == code:
+            if tokens.email_confirm.check_token(user, code):
                 user.email_confirmed = True
-                user.email_confirm_code = None
                 user.is_active = True
-                user.save(update_fields=['email_confirmed', 'email_confirm_code', 'is_active'])
-
-                signals.email_confirmed.send(User, user=user)
+                with transaction.atomic():
+                    user.save(update_fields=['email_confirmed', 'is_active'])
+                    signals.email_confirmed.send(User, user=user)
 
                 login(self.request, user)
                 signals.signup_completed.send(User, user=user)
 
-            elif user.new_email_confirm_code == code:
-                user.backend = 'django.contrib.auth.backends.ModelBackend'
-                login(self.request, user)
-                signals.signup_completed.send(User, user=user)
-
-                if not User.objects.filter(email=user.new_email).exists():
-                    user.email = user.new_email
-                    user.new_email = None
-                    user.new_email_confirm_code = None
-                    user.email_confirmed = True
-                    user.save(update_fields=['email', 'new_email', 'new_email_confirm_code', 'email_confirmed'])
+            elif user.new_email and tokens.new_email_confirm.check_token(user, code):
+                old_email, new_email, email_confirmed = user.email, user.new_email, user.email_confirmed
+                user.email = new_email
+                user.new_email = None
+                user.email_confirmed = True
+                try:
+                    # claims new_email, releases the old one
+                    user.save(update_fields=['email', 'new_email', 'email_confirmed'])
+                except IntegrityError:
+                    # new_email belongs to another account, e.g. left unclaimed by the claims backfill
+                    user.email, user.new_email, user.email_confirmed = old_email, new_email, email_confirmed
+                else:
+                    user.backend = 'django.contrib.auth.backends.ModelBackend'
+                    login(self.request, user)
+                    signals.signup_completed.send(User, user=user)
 
         next = data['next'] or '/'
 
         return redirect(next)
 
 
-class ResendEmailConfirm(ApiView):
+class ResendEmailConfirm(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Re-send user email confirmation
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 1  # user lookup
+
     spec = Spec(
         Method.POST,
         s.Object(
             email=s.String()
         ),
         Response(202),
+        Response(429, schema=Errors),
     )
 
     def handle(self, data):
         email = data['email'].lower()
+        if ratelimit.exceeded(self.request, 'resend_email_confirm', email=email):
+            return TOO_MANY_REQUESTS
+
         user = User.objects.filter(is_active=True).filter(Q(email=email) | Q(new_email=email)).first()
         if user:
-            if (email == user.email and user.email_confirm_code):
+            if email == user.email and not user.email_confirmed:
                 signals.user_email_confirm.send(User, user=user, email=email)
 
-            if (email == user.new_email and user.new_email_confirm_code):
+            if email == user.new_email:
                 signals.user_new_email_confirm.send(User, user=user, email=email)
 
         return 202
 
 
-class ChangeEmail(ApiView):
+class ChangeEmail(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Change user email
     '''
+    transaction_policy = transaction.BLOCK
+    query_budget = 4  # user lookup, email claim, released pending claim, user update
+
     spec = Spec(
         Method.POST,
         s.Object(
@@ -217,60 +253,66 @@ class ChangeEmail(ApiView):
 
     def handle(self, data):
         user = getattr(self.request, 'user', None)
-        if not (user or user.is_authenticated):
+        if not (user and user.is_authenticated):
             return 403
 
         email = data['email'].lower()
 
-        if User.objects.exclude(pk=user.pk).filter(Q(email=email) | Q(new_email=email)):
-            return 400, {'errors': ['This email is already in use']}
-
-        if user.email != email:
-            user.email = email
-            user.save(update_fields={'email'})
+        with transaction.atomic():
+            if user.email == email:
+                EmailClaim.objects.release(user, user.new_email)
+                user.new_email = None
+            else:
+                if email != user.new_email:
+                    if not EmailClaim.objects.claim(email, user):
+                        return 400, {'errors': ['This email is already in use']}
+                    EmailClaim.objects.release(user, user.new_email)
 
-        if user.email == email:
-            user.new_email = None
-            user.new_email_confirm_code = None
-        else:
-            user.new_email = email
-            user.new_email_confirm_code = random_key()
+                user.new_email = email
 
-            signals.user_new_email_confirm.send(User, user=user, email=email)
+                signals.user_new_email_confirm.send(User, user=user, email=email)
 
-        user.save(update_fields={'new_email', 'new_email_confirm_code'})
+            user.save(update_fields={'new_email'})
 
         return 200, {'email': user.email}
 
 
-class ResetPassword(ApiView):
+class ResetPassword(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Reset password confirmation
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 1  # user lookup
+
     spec = Spec(
         Method.POST,
         s.Object(
             email=s.String(),
         ),
         Response(202),
+        Response(429, schema=Errors),
     )
 
     def handle(self, data):
         email = data['email'].lower()
+        if ratelimit.exceeded(self.request, 'reset_password', email=email):
+            return TOO_MANY_REQUESTS
+
         user = User.objects.filter(email=email, is_active=True).first()
 
         if user:
-            user.password_reset_code = random_key()
-            user.save(update_fields={'password_reset_code'})
             signals.password_reset.send(User, user=user)
 
         return 202
 
 
-class SetPassword(ApiView):
+class SetPassword(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Set new user password
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 3  # user lookup and update, last_login
+
     spec = Spec(
         Method.POST,
         s.Object(
@@ -280,32 +322,30 @@ class SetPassword(ApiView):
         ),
         Response(200, schema=UserDef),
         Response(400, schema=Errors),
+        Response(503, schema=Errors, description='password hashing is saturated'),
     )
 
     def handle(self, data):
-        user = User.objects.filter(pk=data['id'], is_active=True, password_reset_code=data['code']).first()
-        if not user:
+        user = User.objects.filter(pk=data['id'], is_active=True).first()
+        if not user or not tokens.password_reset.check_token(user, data['code']):
             return 400, {'errors': ['Invalid password reset code']}
 
         user.set_password(data['password'])
         user.email_confirmed = True
-        user.password_reset_code = None
-        user.save(update_fields={'password', 'email_confirm', 'password_reset_code'})
+        user.save(update_fields={'password', 'email_confirmed'})
 
         login(self.request, user)
 
-        return 200, {
-            'id': user.pk,
-            'email': user.email,
-            'first_name': user.first_name,
-            'short_name': user.get_short_name(),
-        }
+        return 200, self.project(UserProjection, user)
 
 
-class ChangePassword(ApiView):
+class ChangePassword(TransactionPolicyMixin, CompiledSpecMixin, ApiView):
     '''
     Change user password
     '''
+    transaction_policy = transaction.NONE
+    query_budget = 2  # user lookup and update
+
     spec = Spec(
         Method.POST,
         s.Object(
@@ -315,11 +355,12 @@ class ChangePassword(ApiView):
         Response(403, description='unauthorized access'),
         Response(400, schema=Errors),
         Response(202),
+        Response(503, schema=Errors, description='password hashing is saturated'),
     )
 
     def handle(self, data):
         user = getattr(self.request, 'user', None)
-        if not (user or user.is_authenticated):
+        if not (user and user.is_authenticated):
             return 403
 
         if not user.check_password(data['old_password']):
@@ -330,3 +371,6 @@ class ChangePassword(ApiView):
 
         return 202
 
+
+# request validators are compiled once here instead of walking the schemas on every request
+compile_views(globals())
@@ -0,0 +1,116 @@
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.files import File
+
+__all__ = ('AvatarError', 'AvatarFetchError', 'get_session', 'fetch_avatar')
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class AvatarError(Exception):
+    """
+    permanent failure, retrying won't help
+    """
+
+
+class AvatarFetchError(AvatarError):
+    """
+    transient failure: timeouts, connection errors, 5xx responses
+    """
+
+
+_local = threading.local()
+
+
+def get_session():
+    session = getattr(_local, 'session', None)
+    if session is None or _local.pid != os.getpid():
+        config = settings.AVATAR_FETCH
+        adapter = HTTPAdapter(pool_connections=config['POOL_SIZE'], pool_maxsize=config['POOL_SIZE'])
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+        _local.pid = os.getpid()
+    return session
+
+
+def sniff_extension(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def fetch_avatar(url):
+    """
+    stream {url} into a temporary file, returns django File
+    or raises AvatarError / AvatarFetchError
+    """
+    config = settings.AVATAR_FETCH
+    max_size = config['MAX_SIZE']
+
+    try:
+        response = get_session().get(url, stream=True, timeout=(config['CONNECT_TIMEOUT'], config['READ_TIMEOUT']))
+    except requests.exceptions.RequestException as e:
+        raise AvatarFetchError('{}: {}'.format(url, e))
+
+    tmp = tempfile.TemporaryFile()
+    try:
+        if response.status_code >= 500:
+            raise AvatarFetchError('{}: HTTP {}'.format(url, response.status_code))
+        if response.status_code != 200:
+            raise AvatarError('{}: HTTP {}'.format(url, response.status_code))
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type and not content_type.startswith('image/'):
+            raise AvatarError('{}: unexpected content type {}'.format(url, content_type))
+
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise AvatarError('{}: {} bytes is over the {} bytes limit'.format(url, content_length, max_size))
+
+        size = 0
+        extension = None
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if extension is None:
+                extension = sniff_extension(chunk[:16])
+                if extension is None:
+                    raise AvatarError('{}: not an image'.format(url))
+            size += len(chunk)
+            if size > max_size:
+                raise AvatarError('{}: body is over the {} bytes limit'.format(url, max_size))
+            tmp.write(chunk)
+
+        if extension is None:
+            raise AvatarError('{}: empty body'.format(url))
+
+    except requests.exceptions.RequestException as e:
+        tmp.close()
+        raise AvatarFetchError('{}: {}'.format(url, e))
+    except Exception:
+        tmp.close()
+        raise
+    finally:
+        response.close()
+
+    tmp.seek(0)
+    name = os.path.basename(urllib.parse.urlparse(url).path) or 'avatar'
+    name = '{}.{}'.format(os.path.splitext(name)[0], extension)
+    return File(tmp, name=name)
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .enqueue import build_task, create_tasks, task_name
+
+__all__ = ('delay_once',)
+
+
+def delay_once(task, window, **kwargs):
+    """
+    enqueue {task}(**kwargs) unless the same call is already pending and not yet taken by a worker,
+    a new job is delayed by {window} so a burst of calls collapses into it
+    """
+    if settings.ROBUST_ALWAYS_EAGER:
+        return task.delay(**kwargs)
+
+    from robust.models import Task
+
+    name = task_name(task)
+    new = build_task(task, kwargs, eta=timezone.now() + window if window else None)
+    payload = new.payload
+    key = '{}:{}'.format(name, json.dumps(payload, sort_keys=True))
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # serializes concurrent enqueues of the same call until commit
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [key])
+            # rows locked by a running worker are skipped, its run may predate this call
+            cursor.execute(
+                'SELECT id FROM robust_task WHERE name = %s AND payload = %s::jsonb AND status = %s '
+                'LIMIT 1 FOR UPDATE SKIP LOCKED',
+                [name, json.dumps(payload), Task.PENDING],
+            )
+            row = cursor.fetchone()
+        if row:
+            return Task.objects.get(pk=row[0])
+
+        return create_tasks([new])[0]
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+__all__ = ('task_name', 'build_task', 'create_tasks')
+
+
+def task_name(task):
+    """
+    the name robust stores for {task}, as TaskWrapper.delay() does
+    """
+    return '{}.{}'.format(task.__module__, task.__name__)
+
+
+def build_task(task, kwargs, eta=None):
+    from robust.models import Task, wrap_payload
+
+    return Task(name=task_name(task), payload=wrap_payload(kwargs) or {}, tags=task.tags or [],
+                retries=task.retries, eta=eta)
+
+
+def create_tasks(tasks):
+    """
+    insert unsaved {tasks} rows at once: one INSERT for the tasks, one for their events and a single NOTIFY,
+    the work robust's Task post_save receivers do per row, which bulk_create doesn't send
+    """
+    from robust.models import TaskEvent
+
+    if not tasks:
+        return tasks
+
+    with transaction.atomic():
+        type(tasks[0]).objects.bulk_create(tasks)
+        if getattr(settings, 'ROBUST_LOG_EVENTS', True):
+            TaskEvent.objects.bulk_create([
+                TaskEvent(task=task, status=task.status, eta=task.eta, created_at=task.created_at)
+                for task in tasks
+            ])
+        with connection.cursor() as cursor:
+            # delivered on commit
+            cursor.execute('NOTIFY robust')
+    return tasks
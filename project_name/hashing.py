@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.module_loading import import_string
+
+from . import signals
+
+__all__ = ('HashingSaturated', 'get_service', 'reset_service', 'make_password', 'check_password')
+
+logger = logging.getLogger(__name__)
+
+
+class HashingSaturated(Exception):
+    def __init__(self, message, retry_after=1):
+        super(HashingSaturated, self).__init__(message)
+        self.retry_after = retry_after
+
+
+def _must_update(encoded):
+    preferred = hashers.get_hasher('default')
+    hasher = hashers.identify_hasher(encoded)
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def _timed(fn, *args):
+    started = time.process_time()
+    result = fn(*args)
+    return result, time.process_time() - started
+
+
+class InlineHashingService:
+    """
+    runs password hashing in the calling thread
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.pending = 0
+        self.max_pending = None
+        # CPU seconds of completed jobs that ran outside the calling threads
+        self.cpu_time = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        return fn(*args)
+
+    def _run(self, operation, fn, *args):
+        with self._lock:
+            self.pending += 1
+        started = time.monotonic()
+        try:
+            return self.submit(fn, *args)
+        finally:
+            duration = time.monotonic() - started
+            with self._lock:
+                self.pending -= 1
+                pending = self.pending
+            logger.debug('password %s took %.3fs, pending %s/%s', operation, duration, pending, self.max_pending)
+            signals.password_hashed.send(type(self), operation=operation, duration=duration,
+                                         pending=pending, max_pending=self.max_pending)
+
+    def make_password(self, password):
+        if password is None:
+            return hashers.make_password(None)
+        return self._run('make', hashers.make_password, password)
+
+    def check_password(self, password, encoded, setter=None):
+        if password is None or not hashers.is_password_usable(encoded):
+            return False
+
+        is_correct = self._run('check', hashers.check_password, password, encoded)
+        if setter and is_correct and _must_update(encoded):
+            setter(password)
+        return is_correct
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+        }
+
+
+class PoolHashingService(InlineHashingService):
+    """
+    runs password hashing in a bounded process pool,
+    rejects new jobs with HashingSaturated when the queue is full
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=5, **options):
+        super(PoolHashingService, self).__init__(**options)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+
+    @property
+    def executor(self):
+        # the pool can't be shared with forked children (uWSGI workers, robust supervisor)
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingSaturated('password hashing queue is full ({} pending)'.format(self.max_pending))
+
+        try:
+            future = self.executor.submit(_timed, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is held until the job is done, a timed out job keeps running in the pool
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result, cpu_time = future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HashingSaturated('password hashing timed out after {}s'.format(self.timeout))
+        with self._lock:
+            self.cpu_time += cpu_time
+        return result
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+_service = None
+
+
+def get_service():
+    global _service
+    if _service is None:
+        config = dict(settings.PASSWORD_HASHING_SERVICE)
+        backend_cls = import_string(config.pop('BACKEND'))
+        _service = backend_cls(**{key.lower(): value for key, value in config.get('OPTIONS', {}).items()})
+    return _service
+
+
+def reset_service():
+    global _service
+    if isinstance(_service, PoolHashingService):
+        _service.shutdown()
+    _service = None
+
+
+def make_password(password):
+    return get_service().make_password(password)
+
+
+def check_password(password, encoded, setter=None):
+    return get_service().check_password(password, encoded, setter)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db.models import Q
+
+__all__ = ('DEFAULT', 'lane', 'lane_filter', 'next_tasks')
+
+TAG_PREFIX = 'lane:'
+DEFAULT = 'default'
+
+
+def lane(name):
+    """
+    robust task tags putting a task into lane {name},
+    tasks without a lane tag belong to the default lane
+    """
+    if name not in settings.ROBUST_LANES:
+        raise ValueError('unknown robust lane {!r}'.format(name))
+    if name == DEFAULT:
+        return []
+    return [TAG_PREFIX + name]
+
+
+def lane_filter(name):
+    if name == DEFAULT:
+        others = [TAG_PREFIX + other for other in settings.ROBUST_LANES if other != DEFAULT]
+        return ~Q(tags__overlap=others)
+    return Q(tags__contains=[TAG_PREFIX + name])
+
+
+def next_tasks(lanes, limit=1):
+    """
+    Task.objects.next() restricted to {lanes}, higher priority lanes
+    (earlier in settings.ROBUST_LANES) are drained first
+    """
+    from robust.models import Task
+
+    tasks = []
+    for name in sorted(lanes, key=settings.ROBUST_LANES.index):
+        tasks.extend(Task.objects.filter(lane_filter(name)).next(limit=limit - len(tasks)))
+        if len(tasks) >= limit:
+            break
+    return tasks
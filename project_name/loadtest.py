@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import hashing, tokens
+from .models import EmailClaim, User
+
+__all__ = ('SCENARIOS', 'seed_users', 'run', 'summarize', 'compare', 'read_baseline', 'write_baseline')
+
+PASSWORD = 'load-test-password'
+
+METRICS = OrderedDict([
+    # name, True when a higher value is a regression
+    ('p50', True),
+    ('p95', True),
+    ('p99', True),
+    ('throughput', False),
+    ('queries', True),
+    ('cpu', True),
+])
+
+thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+class Seed:
+    """
+    {users} confirmed users sharing one password hash, {unconfirmed} users waiting for email_confirm,
+    each confirmed once, emails created by the scenarios start with {prefix}
+    """
+
+    def __init__(self, users, unconfirmed, prefix):
+        self.users = users
+        self.unconfirmed = unconfirmed
+        self.prefix = prefix
+
+
+def seed_users(users, unconfirmed):
+    password = make_password(PASSWORD)
+    prefix = 'load-{:x}'.format(int(time.time() * 1000))
+    result = Seed([], [], prefix)
+    for target, count, confirmed in ((result.users, users, True), (result.unconfirmed, unconfirmed, False)):
+        created = User.objects.bulk_create([
+            User(email='{}-{}-{}@example.org'.format(prefix, 'user' if confirmed else 'unconfirmed', index),
+                 first_name='Load', last_name='Test', password=password,
+                 email_confirmed=confirmed, is_active=True)
+            for index in range(count)
+        ])
+        EmailClaim.objects.bulk_create([EmailClaim(email=user.email, user=user) for user in created])
+        target.extend(created)
+    return result
+
+
+def json_post(client, path, data):
+    return client.post('/api/' + path, json.dumps(data), content_type='application/json')
+
+
+def signin(client, seed, index):
+    user = seed.users[index % len(seed.users)]
+    return json_post(client, 'signin/', {'email': user.email, 'password': PASSWORD})
+
+
+def signup(client, seed, index):
+    return json_post(client, 'signup/', {
+        'email': '{}-signup-{}@example.org'.format(seed.prefix, index),
+        'first_name': 'Load', 'last_name': 'Test', 'password': PASSWORD,
+    })
+
+
+def email_confirm(client, seed, index):
+    # a token stops working once its user is confirmed, the endpoint would still redirect
+    user = seed.unconfirmed[index]
+    return client.get('/api/email_confirm/', {'id': user.pk, 'code': tokens.email_confirm.make_token(user)})
+
+
+def reset_password(client, seed, index):
+    return json_post(client, 'reset_password/', {'email': seed.users[index % len(seed.users)].email})
+
+
+def change_email(client, seed, index):
+    return json_post(client, 'change_email/', {'email': '{}-new-{}@example.org'.format(seed.prefix, index)})
+
+
+# name -> (request, whether the client is signed in)
+SCENARIOS = OrderedDict([
+    ('signin', (signin, False)),
+    ('signup', (signup, False)),
+    ('email_confirm', (email_confirm, False)),
+    ('reset_password', (reset_password, False)),
+    ('change_email', (change_email, True)),
+])
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(samples, elapsed, pool_cpu=0):
+    """
+    {samples} are (status, latency, queries, cpu) of every request, times in seconds,
+    {pool_cpu} is the CPU time the password hashing pool spent meanwhile,
+    any status other than 2xx/3xx is an error, latencies and cpu are reported in ms
+    """
+    ok = [sample for sample in samples if sample[0] is not None and 200 <= sample[0] < 400]
+    latencies = [sample[1] for sample in ok]
+    return OrderedDict([
+        ('requests', len(samples)),
+        ('errors', len(samples) - len(ok)),
+        ('p50', percentile(latencies, 0.5) * 1000),
+        ('p95', percentile(latencies, 0.95) * 1000),
+        ('p99', percentile(latencies, 0.99) * 1000),
+        ('throughput', len(ok) / elapsed if elapsed else 0),
+        ('queries', sum(sample[2] for sample in ok) / len(ok) if ok else 0),
+        ('cpu', (sum(sample[3] for sample in ok) + pool_cpu) / len(ok) * 1000 if ok else 0),
+    ])
+
+
+def worker(scenario, seed, indexes, samples, barrier):
+    request, signed_in = SCENARIOS[scenario]
+    client = Client()
+    try:
+        if signed_in:
+            client.force_login(seed.users[indexes[0] % len(seed.users)])
+        if barrier is not None:
+            barrier.wait()
+        for index in indexes:
+            started, cpu_started = time.perf_counter(), thread_time()
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    status = request(client, seed, index).status_code
+                except Exception:
+                    status = None
+            samples.append((status, time.perf_counter() - started, len(queries), thread_time() - cpu_started))
+    finally:
+        if barrier is not None:
+            connection.close()
+
+
+def run(scenario, seed, requests, concurrency):
+    """
+    {requests} requests of {scenario} through the test client, the full middleware stack and the api router,
+    from {concurrency} threads with their own connections, a single thread runs in the caller's connection
+    """
+    if scenario == 'email_confirm':
+        if requests > len(seed.unconfirmed):
+            raise ValueError('email_confirm needs {} unconfirmed users, {} left'.format(
+                requests, len(seed.unconfirmed)))
+        used, seed.unconfirmed = seed.unconfirmed[:requests], seed.unconfirmed[requests:]
+        seed = Seed(seed.users, used, seed.prefix)
+
+    samples = []
+    chunks = [range(start, requests, concurrency) for start in range(concurrency)]
+    pool_cpu = hashing.get_service().cpu_time
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(scenario, seed, chunks[0], samples, None)
+    else:
+        barrier = threading.Barrier(concurrency + 1)
+        threads = [threading.Thread(target=worker, args=(scenario, seed, chunk, samples, barrier)) for chunk in chunks]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed, hashing.get_service().cpu_time - pool_cpu)
+
+
+def compare(results, baseline, threshold):
+    """
+    metrics of {results} worse than {baseline} by more than {threshold} (a fraction)
+    """
+    regressions = []
+    for scenario, stats in results.items():
+        if scenario not in baseline:
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            old, new = baseline[scenario].get(metric), stats[metric]
+            if not old:
+                continue
+            change = (new - old) / old if higher_is_worse else (old - new) / old
+            if change > threshold:
+                regressions.append('{} {}: {:.2f} -> {:.2f} ({:+.0%})'.format(
+                    scenario, metric, old, new, change if higher_is_worse else -change))
+    return regressions
+
+
+def read_baseline(path):
+    """
+    the stored baseline, None when none was recorded at {path}
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_baseline(path, results, baseline=None):
+    data = dict(baseline or {})
+    data.update(results)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
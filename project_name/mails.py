@@ -1,12 +1,16 @@
+import contextlib
 import logging
+import threading
+import time
 import urllib.parse
 
 from django.conf import settings
+from django.core.mail import get_connection
 from django.core.urlresolvers import reverse
-from django.db.models import Q
 from happymailer import Template, Layout, t
 from happymailer.fake import fake
 
+from . import mjml_cache, signals, tokens
 from .models import User
 
 logger = logging.getLogger(__name__)
@@ -51,6 +55,39 @@ class DefaultLayout(Layout):
     '''.format(STATIC_URL=STATIC_URL, DOMAIN=settings.DOMAIN, SITE_NAME=name.capitalize())
 
 
+_batch = threading.local()
+
+
+@contextlib.contextmanager
+def batch(user_ids=()):
+    """
+    mail sent inside the block shares one email backend connection, opened by the first message,
+    the users of {user_ids} are loaded with a single query
+    """
+    _batch.users = User.objects.in_bulk(list(set(user_ids))) if user_ids else {}
+    _batch.connection = None
+    _batch.size = _batch.sent = 0
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        connection, size, sent = _batch.connection, _batch.size, _batch.sent
+        del _batch.users, _batch.connection
+        if connection is not None:
+            connection.close()
+        if size:
+            duration = time.monotonic() - started
+            logger.info('mail batch of %s sent %s in %.3fs', size, sent, duration)
+            signals.mail_batch_sent.send(None, size=size, sent=sent, duration=duration)
+
+
+def get_user(user_id):
+    users = getattr(_batch, 'users', None)
+    if users is not None and user_id in users:
+        return users[user_id]
+    return User.objects.filter(pk=user_id).first()
+
+
 def fake_user():
     first_name = fake.first_name()
     return {
@@ -69,6 +106,26 @@ class BaseTemplate(Template):
     def post_init(self):
         raise NotImplementedError()
 
+    def compile(self):
+        return mjml_cache.compile(self)
+
+    def _send(self, *args, **kwargs):
+        if getattr(_batch, 'users', None) is None:
+            return super()._send(*args, **kwargs)
+
+        if _batch.connection is None:
+            _batch.connection = get_connection()
+            _batch.connection.open()
+        _batch.size += 1
+        try:
+            super()._send(*args, connection=_batch.connection, **kwargs)
+        except Exception:
+            # the next message reconnects
+            connection, _batch.connection = _batch.connection, None
+            connection.close()
+            raise
+        _batch.sent += 1
+
 
 class UserMixin:
     user_variables = {
@@ -98,7 +155,9 @@ class BaseUserTemplate(BaseTemplate, UserMixin):
     }
 
     def post_init(self):
-        self.user = User.objects.get(pk=self.kwargs['user_id'])
+        self.user = get_user(self.kwargs['user_id'])
+        if self.user is None:
+            raise TemplateException('No user found')
         self.add_recipient(self.user.email_recipient)
 
     def get_variables(self):
@@ -128,10 +187,9 @@ class EmailConfirmTemplate(BaseUserTemplate):
 
     def post_init(self):
         email = self.kwargs['email']
-        user = User.objects.filter(pk=self.kwargs['user_id']).filter(Q(email=email) |
-                                                                     Q(new_email=email)).first()
+        user = get_user(self.kwargs['user_id'])
 
-        if user is None:
+        if user is None or email not in (user.email, user.new_email):
             raise TemplateException('No user found')
         self.user = user
 
@@ -140,10 +198,10 @@ class EmailConfirmTemplate(BaseUserTemplate):
         self.confirm_code = None
         if user.email == email:
             recipient = user.email_recipient
-            self.confirm_code = user.email_confirm_code
+            self.confirm_code = tokens.email_confirm.make_token(user)
         elif user.new_email == email:
             recipient = user.new_email_recipient
-            self.confirm_code = user.new_email_confirm_code
+            self.confirm_code = tokens.new_email_confirm.make_token(user)
         else:
             raise TemplateException('Unknown email')
 
@@ -194,9 +252,8 @@ class PasswordReset(BaseUserTemplate):
     }
 
     def post_init(self):
-        user = User.objects.filter(pk=self.kwargs['user_id'],
-                                   is_active=True).filter()
-        if not user or not user.password_reset_code:
+        user = get_user(self.kwargs['user_id'])
+        if not user or not user.is_active:
             raise TemplateException('No user found')
         self.user = user
 
@@ -205,7 +262,7 @@ class PasswordReset(BaseUserTemplate):
     def get_variables(self):
         variables = super(PasswordReset, self).get_variables()
         query = urllib.parse.urlencode(
-            {'id': self.user.pk, 'code': self.user.password_reset_code})
+            {'id': self.user.pk, 'code': tokens.password_reset.make_token(self.user)})
         url = urllib.parse.urlunparse(
             ('https', settings.DOMAIN, '/password_reset/', '', query, ''))
         variables.update({'button_link': url})
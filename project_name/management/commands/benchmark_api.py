@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from ... import loadtest
+
+COLUMNS = ('requests', 'errors', 'p50', 'p95', 'p99', 'throughput', 'queries', 'cpu')
+
+
+class Command(BaseCommand):
+    help = 'Drive the auth API through the router at --concurrency against a freshly seeded test database, ' \
+           'report latency percentiles (ms), throughput (req/s), SQL queries and CPU (ms) per request ' \
+           'and fail when an endpoint regressed against the stored baseline by more than --threshold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', metavar='|'.join(loadtest.SCENARIOS))
+        parser.add_argument('--requests', default=200, type=int, help='per scenario')
+        parser.add_argument('--concurrency', default=8, type=int)
+        parser.add_argument('--users', default=100, type=int)
+        parser.add_argument('--baseline', default=settings.LOADTEST_BASELINE)
+        parser.add_argument('--threshold', default=settings.LOADTEST_THRESHOLD, type=float,
+                            help='allowed regression, a fraction')
+        parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+
+    def handle(self, scenarios, requests, concurrency, users, baseline, threshold, save, **kwargs):
+        unknown = set(scenarios) - set(loadtest.SCENARIOS)
+        if unknown:
+            raise CommandError('unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+        scenarios = scenarios or list(loadtest.SCENARIOS)
+
+        results = {}
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(RATELIMIT_SKIP=True, ROBUST_ALWAYS_EAGER=False):
+                seed = loadtest.seed_users(users, requests)
+                self.stdout.write('{:<16}'.format('') + ''.join('{:>12}'.format(column) for column in COLUMNS))
+                for name in scenarios:
+                    results[name] = loadtest.run(name, seed, requests, concurrency)
+                    self.stdout.write('{:<16}'.format(name) + ''.join(
+                        '{:>12.1f}'.format(results[name][column]) for column in COLUMNS))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        stored = loadtest.read_baseline(baseline)
+        if save:
+            loadtest.write_baseline(baseline, results, stored)
+            self.stdout.write('baseline written to {}'.format(baseline))
+            return
+
+        if stored is None:
+            raise CommandError('no baseline at {}, record one with --save'.format(baseline))
+        missing = [name for name in results if name not in stored]
+        if missing:
+            self.stderr.write('no baseline for {}, not compared'.format(', '.join(missing)))
+        regressions = loadtest.compare(results, stored, threshold)
+        if regressions:
+            raise CommandError('regressed by more than {:.0%}:\n{}'.format(threshold, '\n'.join(regressions)))
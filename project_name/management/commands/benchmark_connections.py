@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+import urllib.parse
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Command(BaseCommand):
+    help = 'Open --connections concurrent connections against a running deployment (uWSGI or the ASGI ' \
+           'application) and report how many requests complete and how fast. --trickle sends each body ' \
+           'slowly, --idle keeps the connection idle before the request, the way slow mobile clients do'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='e.g. http://127.0.0.1:8000/api/reset_password/')
+        parser.add_argument('--connections', default=500, type=int)
+        parser.add_argument('--data', default='{"email": "nobody@example.com"}')
+        parser.add_argument('--trickle', default=0, type=float, help='seconds to send the body over')
+        parser.add_argument('--idle', default=0, type=float, help='seconds before sending the request')
+        parser.add_argument('--timeout', default=30, type=float)
+
+    async def request(self, host, port, path, body, trickle, idle, timeout):
+        started = time.monotonic()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        try:
+            await asyncio.sleep(idle)
+            writer.write('POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\n'
+                         'Content-Length: {}\r\nConnection: close\r\n\r\n'.format(path, host, len(body)).encode())
+            chunks = 10 if trickle else 1
+            size = -(-len(body) // chunks) or 1
+            for offset in range(0, len(body), size):
+                writer.write(body[offset:offset + size])
+                await writer.drain()
+                if trickle:
+                    await asyncio.sleep(trickle / chunks)
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+        finally:
+            writer.close()
+        return int(status_line.split()[1]), time.monotonic() - started
+
+    async def run(self, url, connections, body, trickle, idle, timeout):
+        url = urllib.parse.urlsplit(url)
+        if url.scheme != 'http':
+            raise CommandError('only http:// urls are supported')
+        path = url.path + ('?' + url.query if url.query else '')
+        return await asyncio.gather(*[
+            self.request(url.hostname, url.port or 80, path, body, trickle, idle, timeout)
+            for _ in range(connections)
+        ], return_exceptions=True)
+
+    def handle(self, url, connections, data, trickle, idle, timeout, **kwargs):
+        try:
+            json.loads(data)
+        except ValueError:
+            raise CommandError('--data must be JSON')
+        started = time.monotonic()
+        loop = asyncio.get_event_loop()
+        results = loop.run_until_complete(self.run(url, connections, data.encode(), trickle, idle, timeout))
+        elapsed = time.monotonic() - started
+
+        latencies, errors = [], 0
+        for result in results:
+            if isinstance(result, Exception) or result[0] >= 500:
+                errors += 1
+            else:
+                latencies.append(result[1])
+
+        self.stdout.write('{} connections in {:.1f}s: {} ok, {} failed'.format(
+            connections, elapsed, len(latencies), errors))
+        self.stdout.write('latency p50 {:.0f} ms, p95 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms'.format(
+            *(percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99, 1))))
@@ -0,0 +1,75 @@
+import json
+import re
+import timeit
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+from ... import api
+from ...models import User
+
+CASES = {
+    'Signup': {
+        'valid': {'email': 'lydia@example.org', 'first_name': 'Lydia', 'last_name': 'Deetz',
+                  'password': 'strange-and-unusual', 'next': '/welcome'},
+        'invalid': {'email': 'lydia@example.org', 'first_name': 'Lydia', 'last_name': None, 'password': 42},
+    },
+    'EmailConfirm': {
+        'valid': {'id': '42', 'code': 'MTIzNDU2Nzg5MA:1bXyZq:abcdefghijklmnop', 'next': '/'},
+        'invalid': {'id': 'forty-two', 'code': 'abc'},
+    },
+}
+
+
+def view_path(name):
+    return '/api/{}/'.format(re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower())
+
+
+def build_request(view, data):
+    """
+    the request a client sends to {view} with {data}, as a query string or a JSON body
+    """
+    factory = RequestFactory()
+    path = view_path(view.__name__)
+    if view.compiled_request.node[0] == 'query':
+        return factory.get(path, data)
+    return factory.generic(view.compiled_request.method, path, json.dumps(data), content_type='application/json')
+
+
+class Command(BaseCommand):
+    help = 'Compare request dispatch of the compiled validators with the api library on the same requests, ' \
+           'and response serialization of the compiled functions with json.dumps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', default=100000, type=int)
+
+    def handle(self, number, **kwargs):
+        self.stdout.write('{:<14} {:<8} {:>14} {:>14} {:>8}'.format('view', 'input', 'library us', 'compiled us',
+                                                                   'speedup'))
+        for name, inputs in CASES.items():
+            view = getattr(api, name)
+            for label, data in inputs.items():
+                request = build_request(view, data)
+                match = resolve(request.path)
+                times = []
+                for compiled in (False, True):
+                    # handle() is stubbed, only parsing, dispatch and rendering are measured
+                    with override_settings(API_COMPILED_SCHEMAS=compiled), \
+                            mock.patch.object(view, 'handle', return_value=204):
+                        times.append(timeit.timeit(lambda: match.func(request, *match.args, **match.kwargs),
+                                                   number=number))
+                library_time, compiled_time = times
+                self.stdout.write('{:<14} {:<8} {:>14.2f} {:>14.2f} {:>7.1f}x'.format(
+                    name, label, library_time / number * 1e6, compiled_time / number * 1e6,
+                    library_time / compiled_time))
+
+        user = User(pk=42, email='lydia@example.org', first_name='Lydia', last_name='Deetz',
+                    avatar_urls={'x300': 'https://cdn.example.org/avatars/42/x300.png'})
+        projection = api.UserProjection
+        generic_time = timeit.timeit(lambda: json.dumps(projection.as_dict(user)).encode(), number=number)
+        compiled_time = timeit.timeit(lambda: projection.serialize(user).encode(), number=number)
+        self.stdout.write('{:<14} {:<8} {:>14.2f} {:>14.2f} {:>7.1f}x'.format(
+            'User', 'response', generic_time / number * 1e6, compiled_time / number * 1e6,
+            generic_time / compiled_time))
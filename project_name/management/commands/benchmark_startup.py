@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENTRY_POINTS = {
+    'manage': "import runpy; sys.argv = ['manage.py', 'check']; runpy.run_path('manage.py', run_name='__main__')",
+    'wsgi': 'import project_conf.wsgi',
+    'worker': 'import django; django.setup(); import project_name.worker, project_name.tasks',
+}
+
+RUNNER = '''
+import json, sys
+{code}
+sys.stderr.write('\\n@@startup ' + json.dumps(sorted(m for m in {modules!r} if m in sys.modules)) + '\\n')
+'''
+
+
+def parse_importtime(lines):
+    """
+    cumulative import time in seconds of each top level package from `python -X importtime` output
+    """
+    totals = defaultdict(float)
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue  # nested, already part of its parent's cumulative time
+        try:
+            totals[name.strip().split('.')[0]] += int(cumulative) / 1e6
+        except ValueError:
+            continue  # header
+    return totals
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start time of manage.py, the WSGI application and worker boot in fresh interpreters, ' \
+           'report the slowest imports and fail on STARTUP_BUDGET or STARTUP_LAZY_MODULES violations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entries', nargs='*', metavar='{}'.format('|'.join(sorted(ENTRY_POINTS))))
+        parser.add_argument('--repeat', default=5, type=int)
+        parser.add_argument('--top', default=10, type=int)
+
+    def run_entry(self, name):
+        lazy = sorted({module for modules in settings.STARTUP_LAZY_MODULES.values() for module in modules})
+        command = [sys.executable]
+        if sys.version_info >= (3, 7):
+            command += ['-X', 'importtime']
+        command += ['-c', RUNNER.format(code=ENTRY_POINTS[name], modules=lazy)]
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'project_conf.settings'))
+        started = time.monotonic()
+        process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE, universal_newlines=True)
+        elapsed = time.monotonic() - started
+
+        lines = process.stderr.splitlines()
+        if process.returncode != 0:
+            raise CommandError('{} failed:\n{}'.format(name, process.stderr[-2000:]))
+        loaded = next((json.loads(line[len('@@startup '):]) for line in lines if line.startswith('@@startup ')), [])
+        return elapsed, loaded, parse_importtime(lines)
+
+    def handle(self, entries, repeat, top, **kwargs):
+        unknown = set(entries) - set(ENTRY_POINTS)
+        if unknown:
+            raise CommandError('unknown entry points: {}'.format(', '.join(sorted(unknown))))
+
+        failures = []
+        for name in entries or sorted(ENTRY_POINTS):
+            runs = [self.run_entry(name) for _ in range(repeat)]
+            median = sorted(elapsed for elapsed, _, _ in runs)[len(runs) // 2]
+            _, loaded, imports = runs[-1]
+
+            self.stdout.write('{:<8} median {:.0f} ms over {} runs'.format(name, median * 1000, repeat))
+            for package, seconds in sorted(imports.items(), key=lambda item: -item[1])[:top]:
+                self.stdout.write('    {:<32} {:>8.1f} ms'.format(package, seconds * 1000))
+
+            budget = settings.STARTUP_BUDGET.get(name)
+            if budget is not None and median > budget:
+                failures.append('{} took {:.0f} ms, budget {:.0f} ms'.format(name, median * 1000, budget * 1000))
+            eager = sorted(set(loaded) & set(settings.STARTUP_LAZY_MODULES.get(name, ())))
+            if eager:
+                failures.append('{} imported {}'.format(name, ', '.join(eager)))
+
+        if failures:
+            raise CommandError('startup regression: ' + '; '.join(failures))
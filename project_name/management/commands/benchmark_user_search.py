@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from ...models import User
+from ...search import search_users
+
+SEED_SQL = '''
+INSERT INTO project_name_user (
+    password, is_superuser, email, email_confirmed, first_name, last_name, date_joined, is_active, is_staff
+)
+SELECT '!', false, 'bench' || n || '@' || (ARRAY['example.org', 'mail.test', 'corp.test'])[1 + n % 3],
+       false, (ARRAY['John', 'Lydia', 'Adam', 'Barbara', 'Otho', 'Delia'])[1 + n % 6] || (n % 1000),
+       (ARRAY['Maitland', 'Deetz', 'Juice', 'Betelgeuse'])[1 + n % 4] || (n % 977),
+       now() - (n || ' seconds')::interval, n % 10 <> 0, false
+FROM generate_series(1, %s) AS n
+'''
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare admin user search latency, icontains vs trigram index, on a seeded users table. ' \
+           'Everything runs in a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=1000000, type=int)
+        parser.add_argument('--repeat', default=5, type=int)
+        parser.add_argument('terms', nargs='*', default=['lydia42', 'deetz9', 'bench123456@example.org', 'juice'])
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.monotonic()
+            list(queryset.order_by('-date_joined').values_list('pk', flat=True)[:100])
+            timings.append(time.monotonic() - started)
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    def handle(self, users, repeat, terms, **kwargs):
+        if connection.vendor != 'postgresql':
+            self.stderr.write('the benchmark needs PostgreSQL')
+            return
+
+        try:
+            with transaction.atomic():
+                self.stdout.write('seeding {} users...'.format(users))
+                with connection.cursor() as cursor:
+                    cursor.execute(SEED_SQL, [users])
+                    cursor.execute('ANALYZE project_name_user')
+
+                self.stdout.write('{:<30} {:>14} {:>14}'.format('term', 'icontains ms', 'trigram ms'))
+                for term in terms:
+                    plain = User.objects.filter(Q(email__icontains=term) | Q(first_name__icontains=term) |
+                                                Q(last_name__icontains=term))
+                    plain_median = self.measure(plain, repeat)
+                    trigram_median = self.measure(search_users(User.objects.all(), term), repeat)
+                    self.stdout.write('{:<30} {:>14.1f} {:>14.1f}'.format(term, plain_median, trigram_median))
+                raise Rollback()
+        except Rollback:
+            pass
@@ -0,0 +1,42 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ...models import User
+from ...thumbnails import generate_aliases
+
+
+def regenerate(args):
+    user_id, force = args
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return user_id, {}
+    urls = generate_aliases(user.avatar_image, force=force)
+    if urls != user.avatar_urls:
+        user.update_avatar_urls(urls)
+    return user_id, urls
+
+
+class Command(BaseCommand):
+    help = 'Generate missing avatar thumbnails and refresh User.avatar_urls, optionally across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', default=1, type=int)
+        parser.add_argument('--force', default=False, action='store_true')
+
+    def handle(self, processes, force, **kwargs):
+        user_ids = User.objects.exclude(avatar_image='').exclude(avatar_image=None) \
+            .order_by('pk').values_list('pk', flat=True)
+        jobs = [(user_id, force) for user_id in user_ids]
+
+        if processes > 1:
+            # forked workers must not share the parent's database connections
+            connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.imap_unordered(regenerate, jobs, chunksize=16)
+                refreshed = sum(1 for _, urls in results if urls)
+        else:
+            refreshed = sum(1 for _, urls in map(regenerate, jobs) if urls)
+
+        self.stdout.write('refreshed avatars of {} of {} users'.format(refreshed, len(jobs)))
@@ -0,0 +1,36 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = 'Run a robust worker for the given lanes (all by default), ' \
+           'optionally reserving threads for a lane, e.g. --reserve auth=1'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lane', dest='lanes', action='append', choices=settings.ROBUST_LANES)
+        parser.add_argument('--reserve', action='append', default=[], metavar='LANE=THREADS')
+        parser.add_argument('--concurrency', default=multiprocessing.cpu_count(), type=int)
+        parser.add_argument('--bulk', default=settings.ROBUST_WORKER_BULK, type=int)
+        parser.add_argument('--limit', default=None, type=int)
+        parser.add_argument('--runner', default='robust.runners.SimpleRunner')
+        parser.add_argument('--beat', default=False, action='store_true')
+
+    def parse_reserve(self, items):
+        reserve = {}
+        for item in items:
+            name, _, count = item.partition('=')
+            if name not in settings.ROBUST_LANES or not count.isdigit():
+                raise CommandError('wrong --reserve {!r}, expected LANE=THREADS'.format(item))
+            reserve[name] = int(count)
+        return reserve
+
+    def handle(self, lanes, reserve, concurrency, bulk, limit, runner, beat, **kwargs):
+        from ...worker import run_lane_worker
+        try:
+            run_lane_worker(lanes or list(settings.ROBUST_LANES), self.parse_reserve(reserve), concurrency, bulk,
+                            limit, import_string(runner), beat)
+        except ValueError as e:
+            raise CommandError(str(e))
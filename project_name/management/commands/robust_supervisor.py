@@ -0,0 +1,56 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from .robust_lane_worker import Command as LaneWorkerCommand
+
+
+class Command(BaseCommand):
+    help = 'Run robust lane workers in several processes, scaled between --min and --max by the pending ' \
+           'task backlog, recycled after --max-tasks or --max-memory MB and drained on SIGINT/SIGTERM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min', dest='min_workers', default=1, type=int)
+        parser.add_argument('--max', dest='max_workers', default=multiprocessing.cpu_count(), type=int)
+        parser.add_argument('--threads', default=2, type=int, help='threads per worker process')
+        parser.add_argument('--backlog', default=20, type=int, help='due tasks per worker process')
+        parser.add_argument('--max-age', default=30, type=float,
+                            help='add a worker while the oldest due task waits longer, seconds')
+        parser.add_argument('--max-tasks', default=1000, type=int)
+        parser.add_argument('--max-memory', default=None, type=int, help='MB')
+        parser.add_argument('--interval', default=5, type=float)
+        parser.add_argument('--drain-timeout', default=60, type=float)
+        parser.add_argument('--lane', dest='lanes', action='append', choices=settings.ROBUST_LANES)
+        parser.add_argument('--reserve', action='append', default=[], metavar='LANE=THREADS')
+        parser.add_argument('--bulk', default=settings.ROBUST_WORKER_BULK, type=int)
+        parser.add_argument('--runner', default='robust.runners.SimpleRunner')
+        parser.add_argument('--beat', default=False, action='store_true')
+
+    def handle(self, min_workers, max_workers, threads, backlog, max_age, max_tasks, max_memory, interval,
+               drain_timeout, lanes, reserve, bulk, runner, beat, **kwargs):
+        from ...supervisor import Supervisor
+
+        reserve = LaneWorkerCommand().parse_reserve(reserve)
+        if sum(reserve.values()) >= threads:
+            raise CommandError('reserved threads must leave at least one shared thread')
+
+        try:
+            supervisor = Supervisor(
+                {
+                    'lanes': lanes or list(settings.ROBUST_LANES),
+                    'reserve': reserve,
+                    'concurrency': threads,
+                    'bulk': bulk,
+                    'runner_cls': import_string(runner),
+                    'beat': False,
+                },
+                min_workers, max_workers,
+                backlog=backlog, max_age=max_age, max_tasks=max_tasks,
+                max_memory=max_memory * 1024 * 1024 if max_memory else None,
+                beat=beat, interval=interval, drain_timeout=drain_timeout,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        supervisor.run()
@@ -0,0 +1,34 @@
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
+
+from . import user_cache
+from .hashing import HashingSaturated
+
+
+class HashingSaturatedMiddleware:
+    """
+    turns a saturated password hashing pool into 503 instead of 500
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashingSaturated):
+            response = JsonResponse({'errors': ['Service is busy, please try again later']}, status=503)
+            response['Retry-After'] = str(exception.retry_after)
+            return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    resolves request.user through project_name.user_cache instead of a users table SELECT per request
+    """
+
+    def process_request(self, request):
+        assert hasattr(request, 'session'), 'CachedAuthenticationMiddleware requires SessionMiddleware'
+        request.user = SimpleLazyObject(lambda: user_cache.get_user(request))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailClaim',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_claims', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        # confirmed emails first, a pending new_email equal to somebody else's email is left unclaimed
+        migrations.RunSQL(
+            '''
+            INSERT INTO project_name_emailclaim (email, user_id, created_at)
+            SELECT lower(email), id, now() FROM project_name_user
+            ON CONFLICT (email) DO NOTHING
+            ''',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            '''
+            INSERT INTO project_name_emailclaim (email, user_id, created_at)
+            SELECT lower(new_email), id, now() FROM project_name_user WHERE new_email IS NOT NULL
+            ON CONFLICT (email) DO NOTHING
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
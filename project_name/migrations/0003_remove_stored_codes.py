@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0002_emailclaim'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='email_confirm_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='new_email_confirm_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='password_reset_code',
+        ),
+    ]
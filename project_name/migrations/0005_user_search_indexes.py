@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0004_user_avatar_urls'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            "CREATE INDEX project_name_user_search_trgm ON project_name_user USING gin "
+            "((lower(email) || ' ' || lower(first_name) || ' ' || lower(last_name)) gin_trgm_ops)",
+            'DROP INDEX project_name_user_search_trgm',
+        ),
+    ]
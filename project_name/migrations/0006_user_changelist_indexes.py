@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0005_user_search_indexes'),
+    ]
+
+    operations = [
+        # admin changelist ordering (-date_joined, -pk), keyset navigation and date_joined filter
+        migrations.RunSQL(
+            'CREATE INDEX project_name_user_joined ON project_name_user (date_joined DESC, id DESC)',
+            'DROP INDEX project_name_user_joined',
+        ),
+        # is_active=False and is_staff=True are the selective sides of the list filters
+        migrations.RunSQL(
+            'CREATE INDEX project_name_user_inactive_joined ON project_name_user (date_joined DESC, id DESC) '
+            'WHERE NOT is_active',
+            'DROP INDEX project_name_user_inactive_joined',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX project_name_user_staff_joined ON project_name_user (date_joined DESC, id DESC) '
+            'WHERE is_staff',
+            'DROP INDEX project_name_user_staff_joined',
+        ),
+    ]
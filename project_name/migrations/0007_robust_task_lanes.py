@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0006_user_changelist_indexes'),
+        ('robust', '0001_initial'),
+    ]
+
+    operations = [
+        # lane workers look up pending tasks by their lane tag
+        migrations.RunSQL(
+            'CREATE INDEX project_name_robust_task_lane ON robust_task USING gin (tags) WHERE status IN (0, 1)',
+            'DROP INDEX project_name_robust_task_lane',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_name', '0007_robust_task_lanes'),
+    ]
+
+    operations = [
+        # search_users email prefix lookups, lower(email) LIKE 'term%'
+        migrations.RunSQL(
+            'CREATE INDEX project_name_user_email_prefix ON project_name_user (lower(email) text_pattern_ops)',
+            'DROP INDEX project_name_user_email_prefix',
+        ),
+    ]
@@ -0,0 +1,76 @@
+import logging
+import re
+import threading
+
+from django.utils.html import conditional_escape
+from happymailer import Template
+
+__all__ = ('compile', 'invalidate')
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = '[[hm:{}]]'
+PLACEHOLDER_RE = re.compile(r'\[\[hm:([\w.]+)\]\]')
+
+# tags and filters may branch on the actual values, such bodies are compiled on every send
+UNCACHEABLE_RE = re.compile(r'{%|{{[^}]*\|')
+
+_skeletons = {}
+_lock = threading.Lock()
+
+
+def _placeholders(variables, prefix=''):
+    result = {}
+    for key, value in variables.items():
+        path = '{}{}'.format(prefix, key)
+        if isinstance(value, dict):
+            result[key] = _placeholders(value, '{}.'.format(path))
+        else:
+            result[key] = PLACEHOLDER.format(path)
+    return result
+
+
+def _lookup(variables, path):
+    value = variables
+    for key in path.split('.'):
+        value = value[key]
+    return value
+
+
+def cache_key(template):
+    model = template.model
+    return template.layout_cls.name, template.name, model.version if model else None
+
+
+def compile(template):
+    """
+    compile {template} to html, reusing the mjml output compiled once per
+    (layout, template, version) with placeholders instead of the variables
+    """
+    if UNCACHEABLE_RE.search(template.body or ''):
+        return Template.compile(template)
+
+    key = cache_key(template)
+    skeleton = _skeletons.get(key)
+    if skeleton is None:
+        with _lock:
+            skeleton = _skeletons.get(key)
+            if skeleton is None:
+                logger.debug('compile mjml skeleton for %s', key)
+                placeholder_template = type(template)(
+                    None,
+                    _force_layout_cls=template.layout_cls,
+                    _force_variables=_placeholders(template.variables),
+                    **template.kwargs
+                )
+                skeleton = _skeletons[key] = Template.compile(placeholder_template)
+
+    variables = template.variables
+    return PLACEHOLDER_RE.sub(lambda match: conditional_escape(_lookup(variables, match.group(1))), skeleton)
+
+
+def invalidate(name=None):
+    with _lock:
+        for key in list(_skeletons):
+            if name is None or key[1] == name:
+                del _skeletons[key]
@@ -0,0 +1,42 @@
+'use strict';
+
+// Long-lived MJML compiler used by project_name.mjml_server.MjmlServerBackend.
+// Reads one JSON request per line on stdin and answers with one JSON line per request:
+//   {"id": 1, "mjml": "<mjml>...</mjml>"} -> {"id": 1, "html": "...", "errors": []}
+//   {"id": 2, "ping": true}               -> {"id": 2, "pong": true}
+
+const readline = require('readline');
+const mjml = require('mjml');
+
+const mjml2html = mjml.mjml2html || mjml.default || mjml;
+
+function reply(message) {
+  process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+const input = readline.createInterface({input: process.stdin, terminal: false});
+
+input.on('line', (line) => {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (err) {
+    return;
+  }
+
+  if (request.ping) {
+    reply({id: request.id, pong: true});
+    return;
+  }
+
+  try {
+    const result = mjml2html(request.mjml);
+    const html = typeof result === 'string' ? result : result.html;
+    const errors = (result.errors || []).map((error) => error.formattedMessage || error.message || String(error));
+    reply({id: request.id, html: html, errors: errors});
+  } catch (err) {
+    reply({id: request.id, error: String((err && err.message) || err)});
+  }
+});
+
+input.on('close', () => process.exit(0));
@@ -0,0 +1,179 @@
+import itertools
+import json
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from happymailer.backends import Backend, CompileError
+
+__all__ = ('MjmlServerBackend', 'MjmlProcess', 'MjmlServerPool', 'get_pool', 'reset_pool')
+
+logger = logging.getLogger(__name__)
+
+
+class MjmlProcess:
+    """
+    one mjml_server.js process, requests are pipelined over stdin
+    and matched with responses by id on a reader thread
+    """
+
+    def __init__(self, command, cwd=None):
+        self.command = command
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=cwd)
+        self._reader = threading.Thread(target=self._read, name='MjmlReader-{}'.format(self.proc.pid), daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError:
+                logger.warning('mjml server %s: unexpected output %r', self.proc.pid, line)
+                continue
+
+            future = self._pending.pop(message.get('id'), None)
+            if future is None:
+                continue
+            if 'error' in message:
+                future.set_exception(CompileError(message['error']))
+            else:
+                future.set_result(message)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(CompileError('mjml server exited with code {}'.format(self.proc.wait())))
+
+    def submit(self, **request):
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise BrokenPipeError('mjml server is not running')
+            request['id'] = next(self._ids)
+            self._pending[request['id']] = future
+            try:
+                self.proc.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+                self.proc.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self._pending.pop(request['id'], None)
+                raise
+        return future
+
+    def ping(self, timeout):
+        try:
+            return self.submit(ping=True).result(timeout=timeout).get('pong', False)
+        except (BrokenPipeError, OSError, CompileError, TimeoutError):
+            return False
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+
+class MjmlServerPool:
+    def __init__(self, command, processes=1, concurrency=8, timeout=10, cwd=None):
+        self.command = command
+        self.size = processes
+        self.timeout = timeout
+        self.cwd = cwd
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._processes = []
+
+    def _spawn(self):
+        process = MjmlProcess(self.command, cwd=self.cwd)
+        if not process.ping(self.timeout):
+            process.close()
+            raise CompileError('mjml server {} failed health check'.format(' '.join(self.command)))
+        logger.info('started mjml server %s', process.proc.pid)
+        return process
+
+    def _acquire_process(self):
+        with self._lock:
+            for process in list(self._processes):
+                if not process.alive:
+                    logger.warning('mjml server %s died, restarting', process.proc.pid)
+                    self._processes.remove(process)
+            while len(self._processes) < self.size:
+                self._processes.append(self._spawn())
+            return min(self._processes, key=lambda process: process.pending)
+
+    def compile(self, source):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise CompileError('mjml server pool is busy')
+        try:
+            for attempt in range(2):
+                process = self._acquire_process()
+                try:
+                    future = process.submit(mjml=source)
+                except (BrokenPipeError, OSError):
+                    if attempt:
+                        raise CompileError('mjml server is not available')
+                    continue
+                try:
+                    result = future.result(timeout=self.timeout)
+                except TimeoutError:
+                    raise CompileError('mjml server timed out after {}s'.format(self.timeout))
+                for error in result.get('errors') or []:
+                    logger.warning('mjml: %s', error)
+                return result['html']
+        finally:
+            self._slots.release()
+
+    def health(self):
+        with self._lock:
+            return [process.alive and process.ping(self.timeout) for process in self._processes]
+
+    def close(self):
+        with self._lock:
+            for process in self._processes:
+                process.close()
+            self._processes = []
+
+
+_pool = None
+_pool_pid = None
+
+
+def get_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        config = settings.HAPPYMAILER_MJML_SERVER
+        _pool = MjmlServerPool(
+            config['COMMAND'],
+            processes=config.get('PROCESSES', 1),
+            concurrency=config.get('CONCURRENCY', 8),
+            timeout=config.get('TIMEOUT', 10),
+            cwd=settings.BASE_DIR,
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def reset_pool():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+    _pool = None
+
+
+class MjmlServerBackend(Backend):
+    def compile(self, source):
+        return get_pool().compile(source)
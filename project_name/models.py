@@ -4,17 +4,24 @@ import os
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import JSONField
+from django.db import IntegrityError, connections, router, transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from easy_thumbnails.alias import aliases
 from easy_thumbnails.fields import ThumbnailerImageField
 from easy_thumbnails.namers import source_hashed
 
+from . import hashing
 from .utils import capname, random_key
 
 logger = logging.getLogger(__name__)
 
 
+class EmailInUse(IntegrityError):
+    pass
+
+
 class UserQuerySet(models.QuerySet):
     def active(self):
         return self.filter(is_active=True)
@@ -60,10 +67,7 @@ class UserManager(BaseUserManager):
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     new_email = models.EmailField(blank=True, null=True, db_index=True)
-    email_confirm_code = models.TextField(blank=True, null=True)
-    new_email_confirm_code = models.TextField(blank=True, null=True)
     email_confirmed = models.BooleanField(default=False)
-    password_reset_code = models.TextField(blank=True, null=True)
 
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
@@ -84,8 +88,14 @@ class User(AbstractBaseUser, PermissionsMixin):
         null=True,
     )
 
+    # {alias: url} written by the thumbnail tasks, so reading avatars needs no storage or thumbnail lookups
+    avatar_urls = JSONField(blank=True, null=True)
+
     @cached_property
     def avatar(self):
+        if self.avatar_urls:
+            return self.avatar_urls
+
         if not self.avatar_image:
             if self.avatar_url:
                 return {key: self.avatar_url for key in settings.THUMBNAIL_ALIASES['project_name.User.avatar_image']}
@@ -94,6 +104,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         all_options = aliases.all(self.avatar_image)
         return {key: self.avatar_image[key].url for key in all_options.keys()}
 
+    def update_avatar_urls(self, urls):
+        self.avatar_urls = urls or None
+        self.__dict__.pop('avatar', None)
+        self.save(update_fields=['avatar_urls'])
+
     ip_address = models.GenericIPAddressField(blank=True, null=True)
 
     objects = UserManager()
@@ -113,6 +128,35 @@ class User(AbstractBaseUser, PermissionsMixin):
 
         return first_name
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        saving the email also claims it and releases the user's stale claims,
+        raises EmailInUse when the email is claimed by somebody else
+        """
+        if update_fields is not None and 'email' not in update_fields:
+            return super().save(force_insert, force_update, using, update_fields)
+
+        adding = self._state.adding
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
+            claims = EmailClaim.objects.db_manager(using)
+            if not claims.claim(self.email, self):
+                raise EmailInUse(self.email)
+            if not adding:
+                claims.release_stale(self)
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return hashing.check_password(raw_password, self.password, setter)
+
     def get_full_name(self):
         return self._get_name(short=False)
 
@@ -129,3 +173,47 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return '{} (ID: {})'.format(self.get_full_name(), self.id)
+
+
+class EmailClaimManager(models.Manager):
+    def claim(self, email, user):
+        """
+        claim case-normalized {email} for {user} with a single INSERT ... ON CONFLICT,
+        returns False if the email is already claimed by somebody else
+        """
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (email, user_id, created_at) VALUES (%s, %s, now()) '
+                'ON CONFLICT (email) DO UPDATE SET user_id = EXCLUDED.user_id '
+                'WHERE {table}.user_id = EXCLUDED.user_id '
+                'RETURNING id'.format(table=table),
+                [email.lower(), user.pk],
+            )
+            return cursor.fetchone() is not None
+
+    def release_stale(self, user):
+        """
+        release the claims of {user} other than its email and pending new_email
+        """
+        current = [email.lower() for email in (user.email, user.new_email) if email]
+        self.filter(user=user).exclude(email__in=current).delete()
+
+    def release(self, user, *emails):
+        emails = [email.lower() for email in emails if email]
+        if emails:
+            self.filter(user=user, email__in=emails).delete()
+
+
+class EmailClaim(models.Model):
+    """
+    current and pending user emails, one row per lowercased address
+    """
+    email = models.EmailField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='email_claims')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = EmailClaimManager()
+
+    def __str__(self):
+        return self.email
@@ -0,0 +1,79 @@
+import logging
+
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+__all__ = ('EstimatedCountPaginator', 'estimate_count')
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_count(queryset):
+    """
+    planner row estimate: pg_class.reltuples for the whole table,
+    EXPLAIN for a filtered queryset, None if not available
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row else None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    uses the planner estimate instead of COUNT(*) once it is above ESTIMATE_THRESHOLD,
+    deep pages select primary keys first so the OFFSET scan stays on the ordering index
+    """
+    ESTIMATE_THRESHOLD = 100000
+    DEFERRED_JOIN_OFFSET = 10000
+
+    @cached_property
+    def estimated(self):
+        try:
+            estimate = estimate_count(self.object_list)
+        except Exception:
+            logger.warning('count estimate failed', exc_info=True)
+            return None
+        if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+            return estimate
+        return None
+
+    @cached_property
+    def count(self):
+        if self.estimated is not None:
+            return self.estimated
+        return super(EstimatedCountPaginator, self).count
+
+    def validate_number(self, number):
+        if self.estimated is None:
+            return super(EstimatedCountPaginator, self).validate_number(number)
+
+        # the estimate may be off either way, the page is simply empty past the real end
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        if bottom < self.DEFERRED_JOIN_OFFSET:
+            return super(EstimatedCountPaginator, self).page(number)
+
+        pks = list(self.object_list.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        objects = {obj.pk: obj for obj in self.object_list.filter(pk__in=pks)}
+        return self._get_page([objects[pk] for pk in pks if pk in objects], number, self)
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+__all__ = ('SlidingWindowLimiter', 'CacheLimiter', 'get_client_ip', 'exceeded', 'reset')
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowLimiter:
+    """
+    in-process sliding window counter,
+    approximates the window with the weighted previous and current fixed windows,
+    when {max_keys} are tracked expired counters go first, then the least recently hit ones
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # key -> (expires, window, previous_count, count), least recently hit first
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period, now=None):
+        if now is None:
+            now = time.monotonic()
+        current = int(now // period)
+
+        with self._lock:
+            _, window, previous_count, count = self._windows.get(key, (None, current, 0, 0))
+            if window != current:
+                previous_count = count if window == current - 1 else 0
+                count = 0
+
+            weight = 1 - (now % period) / period
+            allowed = previous_count * weight + count < limit
+            if allowed:
+                count += 1
+
+            if key in self._windows:
+                self._windows.move_to_end(key)
+            elif len(self._windows) >= self.max_keys:
+                self._evict(now)
+            # the counter stops weighing once the next window is over
+            self._windows[key] = ((current + 2) * period, current, previous_count, count)
+            return allowed
+
+    def _evict(self, now):
+        for key in [key for key, (expires, _, _, _) in self._windows.items() if expires <= now]:
+            del self._windows[key]
+        # leave some room so the next inserts don't scan the table again
+        while len(self._windows) > self.max_keys * 9 // 10:
+            self._windows.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class CacheLimiter:
+    """
+    shared sliding window counter on top of a django cache backend
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def hit(self, key, limit, period, now=None):
+        if now is None:
+            now = time.time()
+        current = int(now // period)
+        current_key = 'ratelimit:{}:{}'.format(key, current)
+        previous_key = 'ratelimit:{}:{}'.format(key, current - 1)
+
+        self.cache.add(current_key, 0, timeout=period * 2)
+        count = self.cache.incr(current_key)
+        previous_count = self.cache.get(previous_key, 0)
+
+        weight = 1 - (now % period) / period
+        return previous_count * weight + count <= limit
+
+
+_local = SlidingWindowLimiter()
+
+
+def get_client_ip(request):
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def exceeded(request, scope, **values):
+    """
+    count one hit for {scope}:ip and every {scope}:{name} rule,
+    returns True if any of them is over the limit
+    """
+    if getattr(settings, 'RATELIMIT_SKIP', False):
+        return False
+
+    values['ip'] = get_client_ip(request)
+    shared = None
+    if settings.RATELIMIT_CACHE:
+        shared = CacheLimiter(settings.RATELIMIT_CACHE)
+
+    for name, value in sorted(values.items()):
+        rule = settings.RATELIMIT_RULES.get('{}:{}'.format(scope, name))
+        if not rule or value is None:
+            continue
+
+        limit, period = rule
+        key = '{}:{}:{}'.format(scope, name, value)
+        if not _local.hit(key, limit, period):
+            logger.warning('rate limit exceeded for %s', key)
+            return True
+        if shared and not shared.hit(key, limit, period):
+            logger.warning('shared rate limit exceeded for %s', key)
+            return True
+
+    return False
+
+
+def reset():
+    _local.clear()
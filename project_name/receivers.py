@@ -1,10 +1,12 @@
 from typing import Optional
 
 from django.conf import settings
-from django.db import models
+from django.core.signals import setting_changed
+from django.db import models, transaction as db_transaction
 from django.dispatch import receiver
+from happymailer.models import TemplateModel
 
-from . import signals, tasks, transaction
+from . import debounce, hashing, mjml_cache, ratelimit, signals, tasks, transaction, user_cache
 from .models import User
 
 
@@ -29,7 +31,8 @@ def upload_user_avatar(instance: User, created: bool, **kwargs) -> None:
 
 @receiver(signal=signals.user_avatar_updated, sender=User)
 def generate_avatar_thumbs(user: User, **kwargs) -> None:
-    tasks.generate_avatar_thumbnails.delay(user_id=user.pk)
+    transaction.on_commit(debounce.delay_once, tasks.generate_avatar_thumbnails,
+                          settings.AVATAR_THUMBNAILS_DEBOUNCE, user_id=user.pk)
 
 
 @receiver(signal=signals.signup_completed, sender=User)
@@ -57,3 +60,43 @@ def send_user_change_email(user: User, email: str, **kwargs) -> None:
 @receiver(signal=signals.password_reset)
 def send_password_reset_email(user: User, **kwargs) -> None:
     transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=user.pk)
+
+
+@receiver(signal=setting_changed)
+def reset_hashing_service(setting: str, **kwargs) -> None:
+    if setting == 'PASSWORD_HASHING_SERVICE':
+        hashing.reset_service()
+
+
+@receiver(signal=setting_changed)
+def reset_ratelimit(setting: str, **kwargs) -> None:
+    if setting.startswith('RATELIMIT_'):
+        ratelimit.reset()
+
+
+@receiver(signal=models.signals.post_save, sender=TemplateModel)
+@receiver(signal=models.signals.post_delete, sender=TemplateModel)
+def invalidate_mjml_cache(instance: TemplateModel, **kwargs) -> None:
+    mjml_cache.invalidate(instance.name)
+
+
+@receiver(signal=setting_changed)
+def reset_mjml_server(setting: str, **kwargs) -> None:
+    if setting == 'HAPPYMAILER_MJML_SERVER':
+        from . import mjml_server
+        mjml_server.reset_pool()
+
+
+@receiver(signal=models.signals.post_save, sender=User)
+@receiver(signal=models.signals.post_delete, sender=User)
+def invalidate_user_cache(instance: User, **kwargs) -> None:
+    pk = instance.pk
+    user_cache.invalidate(pk)
+    # a concurrent request may re-cache the old row before this transaction commits
+    db_transaction.on_commit(lambda: user_cache.invalidate(pk))
+
+
+@receiver(signal=setting_changed)
+def reset_user_cache(setting: str, **kwargs) -> None:
+    if setting == 'USER_CACHE':
+        user_cache.clear()
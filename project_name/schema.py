@@ -0,0 +1,373 @@
+"""
+api.schema and api.spec constructors recording the declared structure,
+so request schemas can be compiled into specialized validator functions
+and response schemas into specialized serializers
+"""
+import json
+import re
+from hashlib import md5
+from json.encoder import encode_basestring_ascii
+
+import api.schema as s
+import api.spec
+from api.exceptions import RequestParseError
+from django.conf import settings
+
+__all__ = ('Object', 'Query', 'Array', 'String', 'Integer', 'Optional', 'Definition', 'Empty',
+           'Spec', 'Response', 'Projection', 'compile_node', 'compile_serializer', 'compile_view', 'compile_views', 'CompiledSpecMixin')
+
+# query integers taken by the compiled validators, anything else is left to the library
+DIGITS_RE = re.compile(r'\A[0-9]{1,18}\Z')
+
+# id(schema object) -> (schema object, node), nodes are plain tuples:
+# ('object', {name: node}), ('query', {name: node}), ('array', node), ('optional', node),
+# ('string',), ('integer',), ('empty',)
+_nodes = {}
+
+
+def _record(obj, node):
+    _nodes[id(obj)] = (obj, node)
+    return obj
+
+
+def node_of(obj):
+    try:
+        return _nodes[id(obj)][1]
+    except KeyError:
+        raise TypeError('{!r} was not declared through project_name.schema'.format(obj))
+
+
+def Object(**fields):
+    return _record(s.Object(**fields), ('object', {name: node_of(field) for name, field in fields.items()}))
+
+
+def Query(**fields):
+    return _record(s.Query(**fields), ('query', {name: node_of(field) for name, field in fields.items()}))
+
+
+def Array(item):
+    return _record(s.Array(item), ('array', node_of(item)))
+
+
+def Optional(item):
+    return _record(s.Optional(item), ('optional', node_of(item)))
+
+
+def String():
+    return _record(s.String(), ('string',))
+
+
+def Integer():
+    return _record(s.Integer(), ('integer',))
+
+
+def Definition(name, schema):
+    return _record(s.Definition(name, schema), node_of(schema))
+
+
+Empty = _record(s.Empty, ('empty',))
+
+
+def Spec(method, request, *responses, **kwargs):
+    spec = api.spec.Spec(method, request, *responses, **kwargs)
+    spec_info = {'method': getattr(method, 'name', str(method).rsplit('.', 1)[-1]).upper(),
+                 'request': node_of(request),
+                 'responses': {response.code: response for response in responses}}
+    _record(spec, ('spec', spec_info))
+    return spec
+
+
+def Response(code, *args, **kwargs):
+    response = api.spec.Response(code, *args, **kwargs)
+    response.code = code
+    response.schema_node = node_of(kwargs['schema']) if kwargs.get('schema') is not None else None
+    return response
+
+
+class _Compiler:
+    def __init__(self):
+        self.lines = []
+        self.counter = 0
+        self.constants = {}
+
+    def var(self):
+        self.counter += 1
+        return 'v{}'.format(self.counter)
+
+    def constant(self, value):
+        name = 'c{}'.format(len(self.constants) + 1)
+        self.constants[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def fail(self, indent, message):
+        self.emit(indent, 'raise RequestParseError({!r})'.format(message))
+
+    def value(self, node, source, path, indent, query=False):
+        """
+        emits checks of expression {source} against {node}, returns the expression of the result,
+        only values of exactly the declared type pass: no coercion of JSON values and no extra keys,
+        in a query integers are plain digits
+        """
+        kind = node[0]
+        if kind == 'string':
+            self.emit(indent, 'if type({}) is not str:'.format(source))
+            self.fail(indent + 1, '{}: string expected'.format(path))
+            return source
+        if kind == 'integer':
+            if not query:
+                self.emit(indent, 'if type({}) is not int:'.format(source))
+                self.fail(indent + 1, '{}: integer expected'.format(path))
+                return source
+            target = self.var()
+            self.emit(indent, 'if type({}) is not str or not {}.match({}):'.format(
+                source, self.constant(DIGITS_RE), source))
+            self.fail(indent + 1, '{}: integer expected'.format(path))
+            self.emit(indent, '{} = int({})'.format(target, source))
+            return target
+        if kind == 'optional':
+            target = self.var()
+            self.emit(indent, 'if {} is None:'.format(source))
+            self.emit(indent + 1, '{} = None'.format(target))
+            self.emit(indent, 'else:')
+            self.emit(indent + 1, '{} = {}'.format(target, self.value(node[1], source, path, indent + 1, query)))
+            return target
+        if kind == 'array':
+            target, item = self.var(), self.var()
+            self.emit(indent, 'if type({}) is not list:'.format(source))
+            self.fail(indent + 1, '{}: array expected'.format(path))
+            self.emit(indent, '{} = []'.format(target))
+            self.emit(indent, 'for {} in {}:'.format(item, source))
+            self.emit(indent + 1, '{}.append({})'.format(
+                target, self.value(node[1], item, path + '[]', indent + 1, query)))
+            return target
+        if kind in ('object', 'query'):
+            query = query or kind == 'query'
+            self.emit(indent, 'if type({}) is not dict:'.format(source))
+            self.fail(indent + 1, '{}: object expected'.format(path))
+            self.emit(indent, 'if not {}.keys() <= {}:'.format(source, self.constant(frozenset(node[1]))))
+            self.fail(indent + 1, '{}: unexpected keys'.format(path))
+            fields = []
+            for name, field in node[1].items():
+                raw = self.var()
+                field_path = '{}.{}'.format(path, name)
+                self.emit(indent, '{} = {}.get({!r})'.format(raw, source, name))
+                if field[0] != 'optional':
+                    self.emit(indent, 'if {} is None:'.format(raw))
+                    self.fail(indent + 1, '{}: required'.format(field_path))
+                fields.append('{!r}: {}'.format(name, self.value(field, raw, field_path, indent, query)))
+            return '{' + ', '.join(fields) + '}'
+        if kind == 'empty':
+            return '{}'
+        raise TypeError('unknown schema node {!r}'.format(kind))
+
+
+def compile_node(node, name='validate'):
+    """
+    python function validating a parsed value against {node}: one straight-line function per schema,
+    field lookups and type checks inlined, RequestParseError on the first mismatch,
+    it accepts a subset of what the api library accepts for the same schema, the rest is left to the library
+    """
+    compiler = _Compiler()
+    result = compiler.value(node, 'data', 'data', 1)
+    source = 'def {}(data):\n{}\n    return {}\n'.format(name, '\n'.join(compiler.lines), result)
+    namespace = dict(compiler.constants, RequestParseError=RequestParseError)
+    exec(compile(source, '<schema {}>'.format(name), 'exec'), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+class _SerializerCompiler(_Compiler):
+    def text(self, node, source, indent, getters=None):
+        """
+        emits the serialization of expression {source} as {node}, returns the expression of its JSON text,
+        object fields are read with source[name] or, with {getters}, from the attributes of an instance
+        """
+        kind = node[0]
+        if kind == 'string':
+            return 'encode_string({})'.format(source)
+        if kind == 'integer':
+            return 'str(int({}))'.format(source)
+        if kind == 'optional':
+            raw, target = self.var(), self.var()
+            self.emit(indent, '{} = {}'.format(raw, source))
+            self.emit(indent, 'if {} is None:'.format(raw))
+            self.emit(indent + 1, "{} = 'null'".format(target))
+            self.emit(indent, 'else:')
+            self.emit(indent + 1, '{} = {}'.format(target, self.text(node[1], raw, indent + 1)))
+            return target
+        if kind == 'array':
+            target, item = self.var(), self.var()
+            self.emit(indent, '{} = []'.format(target))
+            self.emit(indent, 'for {} in {}:'.format(item, source))
+            self.emit(indent + 1, '{}.append({})'.format(target, self.text(node[1], item, indent + 1)))
+            return "'[' + ','.join({}) + ']'".format(target)
+        if kind in ('object', 'query'):
+            parts = []
+            for name, field in sorted(node[1].items()):
+                if getters is None:
+                    access = '{}[{!r}]'.format(source, name)
+                elif callable(getters.get(name)):
+                    access = 'getters[{!r}]({})'.format(name, source)
+                else:
+                    access = '{}.{}'.format(source, getters.get(name, name))
+                parts.append(repr(('{' if not parts else ',') + json.dumps(name) + ':'))
+                parts.append(self.text(field, access, indent))
+            return ' + '.join(parts + ["'}'"]) if parts else "'{}'"
+        if kind == 'empty':
+            return "'{}'"
+        raise TypeError('unknown schema node {!r}'.format(kind))
+
+
+def compile_serializer(node, name='serialize', getters=None):
+    """
+    python function returning the compact JSON text of a value declared as {node}: keys are
+    pre-encoded, fields are read and encoded inline without the generic encoder walking the value
+    """
+    compiler = _SerializerCompiler()
+    result = compiler.text(node, 'data', 1, getters)
+    source = 'def {}(data):\n{}\n    return {}\n'.format(name, '\n'.join(compiler.lines), result)
+    namespace = {'encode_string': encode_basestring_ascii, 'getters': getters}
+    exec(compile(source, '<serializer {}>'.format(name), 'exec'), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+class Projection:
+    """
+    reads model instances as {schema}: {getters} map fields to attribute names or callables,
+    other fields are attributes of the same name
+    """
+
+    def __init__(self, schema, **getters):
+        self.node = node_of(schema)
+        self.getters = getters
+        self.serialize = compile_serializer(self.node, 'serialize_projection', getters)
+
+    def as_dict(self, instance):
+        result = {}
+        for name in self.node[1]:
+            getter = self.getters.get(name, name)
+            result[name] = getter(instance) if callable(getter) else getattr(instance, getter)
+        return result
+
+
+class Projected:
+    __slots__ = ('projection', 'instance')
+
+    def __init__(self, projection, instance):
+        self.projection = projection
+        self.instance = instance
+
+
+class CompiledRequest:
+    def __init__(self, method, node, validate):
+        self.method = method
+        self.node = node
+        self.validate = validate
+
+    def parse(self, request):
+        """
+        RequestParseError for anything the compiled path doesn't take: repeated query parameters,
+        bodies other than non-empty JSON, values the validator rejects
+        """
+        if self.node[0] == 'empty':
+            return {}
+        if self.node[0] == 'query':
+            if any(len(values) > 1 for values in request.GET.lists()):
+                raise RequestParseError('data: repeated parameter')
+            return self.validate(request.GET.dict())
+        if request.content_type != 'application/json' or not request.body:
+            raise RequestParseError('data: JSON body expected')
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except ValueError:
+            raise RequestParseError('data: invalid JSON')
+        return self.validate(data)
+
+
+def compile_view(view):
+    """
+    compiles the request schema and the response schemas of {view}.spec,
+    called once per view when the router is built
+    """
+    info = node_of(view.spec)[1]
+    view.compiled_request = CompiledRequest(
+        info['method'], info['request'], compile_node(info['request'], 'validate_{}'.format(view.__name__)))
+    view.compiled_responses = {
+        code: compile_serializer(response.schema_node, 'serialize_{}_{}'.format(view.__name__, code))
+        for code, response in info['responses'].items() if response.schema_node is not None
+    }
+    return view
+
+
+def compile_views(namespace):
+    for value in list(namespace.values()):
+        if isinstance(value, type) and issubclass(value, CompiledSpecMixin) and value is not CompiledSpecMixin:
+            compile_view(value)
+
+
+def json_response(text, status):
+    """
+    the ETag is the md5 of the body the serializer just produced, as CommonMiddleware would compute it,
+    so USE_ETAGS doesn't hash the content again
+    """
+    from django.http import HttpResponse
+
+    content = text.encode('ascii')
+    response = HttpResponse(content, content_type='application/json', status=status)
+    if settings.USE_ETAGS:
+        response['ETag'] = '"{}"'.format(md5(content).hexdigest())
+    return response
+
+
+def render(result, serializers=None):
+    from django.http import HttpResponse, HttpResponseBase, JsonResponse
+
+    if isinstance(result, HttpResponseBase):
+        return result
+    if isinstance(result, int):
+        return HttpResponse(status=result)
+    code, body = result if isinstance(result, tuple) else (200, result)
+    if isinstance(body, Projected):
+        return json_response(body.projection.serialize(body.instance), code)
+    if serializers and code in serializers:
+        return json_response(serializers[code](body), code)
+    return JsonResponse(body, status=code)
+
+
+class CompiledSpecMixin:
+    """
+    validates requests with the compiled spec, calls handle() directly and serializes its result
+    with the compiled response serializers, anything the compiled validator doesn't accept goes through
+    the api library path, which parses it again and renders its own errors
+    """
+    compiled_request = None
+    compiled_responses = None
+    compiled_response = False
+
+    def dispatch(self, request, *args, **kwargs):
+        compiled = self.compiled_request
+        if compiled is None or request.method != compiled.method or not settings.API_COMPILED_SCHEMAS:
+            return super().dispatch(request, *args, **kwargs)
+        try:
+            data = compiled.parse(request)
+        except RequestParseError:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.request, self.args, self.kwargs = request, args, kwargs
+        self.compiled_response = True
+        return render(self.handle(data), self.compiled_responses)
+
+    def project(self, projection, instance):
+        """
+        {instance} read through {projection}, serialized straight from the instance
+        when the response is rendered by the compiled serializers
+        """
+        if self.compiled_response:
+            return Projected(projection, instance)
+        return projection.as_dict(instance)
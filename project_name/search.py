@@ -0,0 +1,40 @@
+from django.db import connections
+from django.db.models import Q
+
+__all__ = ('SEARCH_EXPRESSION', 'search_users')
+
+# must match the project_name_user_search_trgm index expression exactly
+SEARCH_EXPRESSION = "(lower(email) || ' ' || lower(first_name) || ' ' || lower(last_name))"
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_users(queryset, term):
+    """
+    filter users by {term} using the pg_trgm GIN index,
+    terms starting with an email local part use the lower(email) prefix index,
+    other databases fall back to icontains
+    """
+    term = term.strip().lower()
+    if not term:
+        return queryset
+
+    postgresql = connections[queryset.db].vendor == 'postgresql'
+
+    if '@' in term and not term.startswith('@') and ' ' not in term:
+        if not postgresql:
+            return queryset.filter(email__istartswith=term)
+        return queryset.extra(where=['lower(email) LIKE %s'], params=['{}%'.format(escape_like(term))])
+
+    if not postgresql:
+        for word in term.split():
+            queryset = queryset.filter(Q(email__icontains=word) | Q(first_name__icontains=word) |
+                                       Q(last_name__icontains=word))
+        return queryset
+
+    for word in term.split():
+        queryset = queryset.extra(where=['{} LIKE %s'.format(SEARCH_EXPRESSION)],
+                                  params=['%{}%'.format(escape_like(word))])
+    return queryset
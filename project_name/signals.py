@@ -15,3 +15,7 @@ password_reset = Signal(providing_args=['user'])
 signup_completed = Signal(providing_args=['user'])
 
 user_avatar_updated = Signal(providing_args=['user'])
+
+password_hashed = Signal(providing_args=['operation', 'duration', 'pending', 'max_pending'])
+
+mail_batch_sent = Signal(providing_args=['size', 'sent', 'duration'])
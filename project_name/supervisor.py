@@ -0,0 +1,187 @@
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import time
+
+from django.db import connections
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .worker import run_lane_worker
+
+__all__ = ('Supervisor', 'queue_stats')
+
+logger = logging.getLogger(__name__)
+
+
+def queue_stats():
+    """
+    number of due pending tasks and the age in seconds of the oldest one
+    """
+    from robust.models import Task
+
+    now = timezone.now()
+    stats = Task.objects \
+        .filter(status__in=[Task.PENDING, Task.RETRY]) \
+        .filter(Q(eta=None) | Q(eta__lte=now)) \
+        .aggregate(depth=Count('pk'), oldest=Min('created_at'))
+    age = (now - stats['oldest']).total_seconds() if stats['oldest'] else 0
+    return stats['depth'], age
+
+
+def rss(pid):
+    """
+    resident memory of process {pid} in bytes, None where /proc is not available
+    """
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def _reset_signals():
+    # forked children inherit Supervisor.stop, they drain on their own handlers instead
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _run_worker(options):
+    _reset_signals()
+    run_lane_worker(**options)
+
+
+def _run_beat():
+    from robust.beat import run_beat
+    _reset_signals()
+    run_beat()
+
+
+class Supervisor:
+    """
+    pre-forks lane worker processes and keeps between {min_workers} and {max_workers} of them:
+    one per {backlog} due tasks, one more while the oldest due task waits longer than {max_age} seconds.
+    Workers exit after {max_tasks} tasks or are drained above {max_memory} bytes and get replaced,
+    SIGINT/SIGTERM drains every worker, stragglers are killed after {drain_timeout} seconds
+    """
+
+    def __init__(self, worker_options, min_workers, max_workers, backlog=20, max_age=30, max_tasks=None,
+                 max_memory=None, beat=False, interval=5, drain_timeout=60):
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError('expected 1 <= min workers <= max workers')
+        self.worker_options = dict(worker_options, limit=max_tasks)
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.backlog = backlog
+        self.max_age = max_age
+        self.max_memory = max_memory
+        self.beat = beat
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+
+        self.workers = []
+        self.draining = []
+        self.beat_process = None
+        self.stopping = False
+
+    def desired(self, depth, age):
+        count = math.ceil(depth / self.backlog) if self.backlog else 0
+        if age > self.max_age:
+            count = max(count, len(self.workers) + 1)
+        return max(self.min_workers, min(self.max_workers, count))
+
+    def spawn(self, target, *args):
+        # children must not share the supervisor's database connections
+        connections.close_all()
+        process = multiprocessing.Process(target=target, args=args)
+        process.start()
+        return process
+
+    def drain(self, process):
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGINT)
+        if process in self.workers:
+            self.workers.remove(process)
+            self.draining.append(process)
+
+    def reap(self):
+        for process in list(self.workers):
+            if not process.is_alive():
+                logger.info('worker %s exited with %s', process.pid, process.exitcode)
+                self.workers.remove(process)
+            elif self.max_memory:
+                memory = rss(process.pid)
+                if memory and memory > self.max_memory:
+                    logger.info('recycle worker %s using %s bytes', process.pid, memory)
+                    self.drain(process)
+        self.draining = [process for process in self.draining if process.is_alive()]
+
+        if self.beat_process is not None and not self.beat_process.is_alive():
+            logger.warning('beat exited with %s', self.beat_process.exitcode)
+            self.beat_process = self.spawn(_run_beat)
+
+    def scale(self):
+        try:
+            depth, age = queue_stats()
+        except Exception:
+            logger.warning('queue stats failed', exc_info=True)
+            depth, age = 0, 0
+        finally:
+            connections.close_all()
+
+        desired = self.desired(depth, age)
+        if desired != len(self.workers):
+            logger.debug('scale %s -> %s workers, %s due tasks, oldest %.1fs', len(self.workers), desired, depth, age)
+
+        while len(self.workers) < desired:
+            self.workers.append(self.spawn(_run_worker, self.worker_options))
+        # scale down gently, one worker per interval
+        if len(self.workers) > desired:
+            self.drain(self.workers[-1])
+
+    def stop(self, *_):
+        if not self.stopping:
+            logger.warning('drain workers')
+        self.stopping = True
+
+    def shutdown(self):
+        for process in list(self.workers):
+            self.drain(process)
+        if self.beat_process is not None and self.beat_process.is_alive():
+            os.kill(self.beat_process.pid, signal.SIGINT)
+            self.draining.append(self.beat_process)
+
+        deadline = time.monotonic() + self.drain_timeout
+        for process in self.draining:
+            process.join(max(0, deadline - time.monotonic()))
+        for process in self.draining:
+            if process.is_alive():
+                logger.warning('kill worker %s', process.pid)
+                os.kill(process.pid, signal.SIGKILL)
+                process.join()
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        if self.beat:
+            self.beat_process = self.spawn(_run_beat)
+        for _ in range(self.min_workers):
+            self.workers.append(self.spawn(_run_worker, self.worker_options))
+
+        next_scale = time.monotonic() + self.interval
+        while not self.stopping:
+            time.sleep(0.5)
+            self.reap()
+            # recycled workers are replaced right away, scaling waits for the interval
+            while len(self.workers) < self.min_workers:
+                self.workers.append(self.spawn(_run_worker, self.worker_options))
+            if time.monotonic() >= next_scale:
+                self.scale()
+                next_scale = time.monotonic() + self.interval
+
+        self.shutdown()
@@ -1,29 +1,44 @@
-import requests
-from django.core.files.base import ContentFile
-from easy_thumbnails.files import generate_all_aliases
+import logging
+
+from django.conf import settings
 from robust import task
 
 from . import mail
+from ..lanes import lane
 from ..models import User
 
+logger = logging.getLogger(__name__)
+
 
-@task(bind=True, retries=3)
+@task(bind=True, retries=3, tags=lane('bulk'))
 def upload_user_avatar(self, user_id: int):
+    # requests and the thumbnail pipeline are loaded by the workers that run avatar tasks only
+    from ..avatars import AvatarError, AvatarFetchError, fetch_avatar
+    from ..thumbnails import generate_aliases
+
     user = User.objects.get(pk=user_id)
+    if not user.avatar_url:
+        return
 
     try:
-        response = requests.get(user.avatar_url, stream=True)
-        if response.status_code == 200:
-            user.avatar_image.save(user.avatar_url, ContentFile(response.raw.read()))
-            user.save(update_fields=['avatar_image'])
+        avatar = fetch_avatar(user.avatar_url)
+    except AvatarFetchError:
+        self.retry(delay=settings.AVATAR_FETCH['RETRY_DELAY'])
+    except AvatarError as e:
+        logger.warning('skip avatar of user %s: %s', user_id, e)
+        return
 
-            generate_all_aliases(user.avatar_image, include_global=False)
+    with avatar:
+        user.avatar_image.save(avatar.name, avatar, save=False)
+    user.avatar_urls = generate_aliases(user.avatar_image) or None
+    user.save(update_fields=['avatar_image', 'avatar_urls'])
 
-    except requests.exceptions.Timeout:
-        self.retry()
 
-
-@task()
+@task(tags=lane('bulk'))
 def generate_avatar_thumbnails(user_id):
+    from ..thumbnails import generate_aliases
+
     instance = User.objects.get(pk=user_id)
-    generate_all_aliases(instance.avatar_image, include_global=False)
+    urls = generate_aliases(instance.avatar_image)
+    if urls != (instance.avatar_urls or {}):
+        instance.update_avatar_urls(urls)
@@ -1,5 +1,6 @@
 from robust import task
 
+from ..lanes import lane
 from ..mails import EmailConfirm, EmailChange, EmailUpdated, PasswordReset, SignupCompleted
 
 
@@ -12,21 +13,21 @@ def mail_signup_completed(user_id):
     return SignupCompleted(user_id=user_id).send()
 
 
-@task()
+@task(tags=lane('auth'))
 def mail_confirm_email(user_id, email, next=None):
     return EmailConfirm(user_id=user_id, email=email, next=next).send()
 
 
-@task()
+@task(tags=lane('auth'))
 def mail_change_email(user_id, email):
     return EmailChange(user_id=user_id, email=email, next=None).send()
 
 
-@task()
+@task(tags=lane('auth'))
 def mail_updated_email(user_id):
     return EmailUpdated(user_id=user_id).send()
 
 
-@task()
+@task(tags=lane('auth'))
 def mail_password_reset(user_id):
     return PasswordReset(user_id=user_id).send()
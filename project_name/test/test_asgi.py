@@ -0,0 +1,38 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from project_conf.asgi import WsgiToAsgi
+
+
+def wsgi_application(environ, start_response):
+    start_response('201 Created', [('Content-Type', 'text/plain')])
+    return [environ['PATH_INFO'].encode(), b'?', environ['QUERY_STRING'].encode(), b' ',
+            environ['wsgi.input'].read()]
+
+
+class WsgiToAsgiTestCase(SimpleTestCase):
+    def test_request(self):
+        messages = [
+            {'type': 'http.request', 'body': b'{"a"', 'more_body': True},
+            {'type': 'http.request', 'body': b': 1}'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/api/signin/', 'query_string': b'next=/',
+            'headers': [(b'content-type', b'application/json')], 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 5000),
+        }
+        application = WsgiToAsgi(wsgi_application, threads=2)
+        asyncio.get_event_loop().run_until_complete(application(scope, receive, send))
+
+        assert sent[0] == {'type': 'http.response.start', 'status': 201,
+                           'headers': [(b'content-type', b'text/plain')]}
+        assert b''.join(message['body'] for message in sent[1:]) == b'/api/signin/?next=/ {"a": 1}'
@@ -1,8 +1,20 @@
-from .utils import APITestCase, CreateMailTemplateMixin, ignore_external
+import copy
+import re
+from unittest import mock
+
+import pytest
+from api.views import ApiView
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .utils import (APITestCase, CreateMailTemplateMixin, JsonClient, check_query_budget, ignore_external,
+                    record_queries)
+from .. import api, hashing, tokens, transaction, user_cache
 from ..factories import UserFactory
-from ..mails import EmailConfirm
+from ..mails import EmailChange, EmailConfirm, EmailUpdated, PasswordReset, SignupCompleted
 from ..utils import random_key
-from ..models import User
+from ..models import EmailClaim, EmailInUse, User
 
 
 @ignore_external
@@ -18,6 +30,16 @@ class SigninTestCase(APITestCase):
         print(response.json())
         assert response.status_code == 200
 
+    def test_avatar_urls_only(self):
+        user = UserFactory(email_confirmed=True)
+        User.objects.filter(pk=user.pk).update(avatar_url='https://example.org/avatar.png')
+        response = self.client.post(self.PATH, {'email': user.email, 'password': user._password})
+        assert response.json()['avatar'] is None
+
+        User.objects.filter(pk=user.pk).update(avatar_urls={'x300': 'https://cdn.example.org/x300.png'})
+        response = self.client.post(self.PATH, {'email': user.email, 'password': user._password})
+        assert response.json()['avatar'] == 'https://cdn.example.org/x300.png'
+
     def test_invalid(self):
         user = UserFactory(email_confirmed=True)
         response = self.client.post(self.PATH, {
@@ -34,6 +56,22 @@ class SigninTestCase(APITestCase):
         })
         assert response.status_code == 423
 
+    @override_settings(RATELIMIT_RULES={'signin:email': (2, 60)})
+    def test_ratelimit(self):
+        user = UserFactory(email_confirmed=True)
+        for _ in range(2):
+            response = self.client.post(self.PATH, {
+                'email': user.email,
+                'password': user._password + '123',
+            })
+            assert response.status_code == 400
+
+        response = self.client.post(self.PATH, {
+            'email': user.email,
+            'password': user._password,
+        })
+        assert response.status_code == 429
+
 
 @ignore_external
 class LogoutTestCase(APITestCase):
@@ -68,7 +106,6 @@ class SignupTestCase(CreateMailTemplateMixin, APITestCase):
         assert user.is_active
         assert user.check_password(password)
         assert not user.email_confirmed
-        assert user.email_confirm_code is not None
 
     def test_duplicate(self):
         user = UserFactory()
@@ -89,3 +126,299 @@ class SignupTestCase(CreateMailTemplateMixin, APITestCase):
             'password': '12345',
         })
         assert response.status_code == 400
+
+
+@ignore_external
+class ChangeEmailTestCase(CreateMailTemplateMixin, APITestCase):
+    PATH = 'change_email/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_mail_template(EmailChange, EmailUpdated)
+
+    def test_change(self):
+        user = UserFactory()
+        self.force_login(user)
+        response = self.client.post(self.PATH, {'email': 'new@example.com'})
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.new_email == 'new@example.com'
+        assert EmailClaim.objects.filter(user=user).count() == 2
+
+    def test_duplicate(self):
+        user, other = UserFactory(), UserFactory()
+        self.force_login(user)
+        response = self.client.post(self.PATH, {'email': other.email.upper()})
+        assert response.status_code == 400
+
+    def test_pending_duplicate(self):
+        user, other = UserFactory(), UserFactory()
+        self.force_login(other)
+        assert self.client.post(self.PATH, {'email': 'new@example.com'}).status_code == 200
+        self.force_login(user)
+        response = self.client.post(self.PATH, {'email': 'new@example.com'})
+        assert response.status_code == 400
+
+
+@ignore_external
+class EmailConfirmTestCase(CreateMailTemplateMixin, APITestCase):
+    PATH = 'email_confirm/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_mail_template(SignupCompleted)
+
+    def test_confirm(self):
+        user = UserFactory(email_confirmed=False)
+        code = tokens.email_confirm.make_token(user)
+        response = self.client.get(self.PATH, {'id': user.pk, 'code': code})
+        assert response.status_code in (301, 302)
+        user.refresh_from_db()
+        assert user.email_confirmed
+        assert not tokens.email_confirm.check_token(user, code)
+
+    def test_wrong_user(self):
+        user, other = UserFactory(email_confirmed=False), UserFactory(email_confirmed=False)
+        code = tokens.email_confirm.make_token(other)
+        self.client.get(self.PATH, {'id': user.pk, 'code': code})
+        user.refresh_from_db()
+        assert not user.email_confirmed
+
+    def test_new_email(self):
+        user = UserFactory()
+        EmailClaim.objects.claim('new@example.com', user)
+        User.objects.filter(pk=user.pk).update(new_email='new@example.com')
+        user.refresh_from_db()
+        self.client.get(self.PATH, {'id': user.pk, 'code': tokens.new_email_confirm.make_token(user)})
+        user.refresh_from_db()
+        assert user.email == 'new@example.com' and user.new_email is None
+        assert set(EmailClaim.objects.filter(user=user).values_list('email', flat=True)) == {'new@example.com'}
+
+    def test_new_email_taken(self):
+        user, other = UserFactory(), UserFactory()
+        # pending new_email left unclaimed by the 0002 backfill
+        User.objects.filter(pk=user.pk).update(new_email=other.email)
+        user.refresh_from_db()
+        response = self.client.get(self.PATH, {'id': user.pk, 'code': tokens.new_email_confirm.make_token(user)})
+        assert response.status_code in (301, 302)
+        user.refresh_from_db()
+        assert user.new_email == other.email and user.email != other.email
+
+
+@ignore_external
+class EmailClaimSyncTestCase(TestCase):
+    def test_email_changed(self):
+        user = UserFactory()
+        user.email = 'changed@example.org'
+        user.save()
+        assert set(EmailClaim.objects.filter(user=user).values_list('email', flat=True)) == {'changed@example.org'}
+
+    def test_email_taken(self):
+        user, other = UserFactory(), UserFactory()
+        user.email = other.email.upper()
+        with pytest.raises(EmailInUse):
+            user.save()
+        assert User.objects.get(pk=user.pk).email != other.email.upper()
+
+
+@ignore_external
+class SetPasswordTestCase(APITestCase):
+    PATH = 'set_password/'
+
+    def test_set_password(self):
+        user = UserFactory()
+        code = tokens.password_reset.make_token(user)
+        response = self.client.post(self.PATH, {'id': user.pk, 'code': code, 'password': 'new-password'})
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.check_password('new-password')
+
+        response = self.client.post(self.PATH, {'id': user.pk, 'code': code, 'password': 'other-password'})
+        assert response.status_code == 400
+
+
+@ignore_external
+class ChangePasswordTestCase(APITestCase):
+    PATH = 'change_password/'
+
+    def test_change_password(self):
+        user = UserFactory()
+        self.login(user)
+        response = self.client.post(self.PATH, {'old_password': user._password, 'new_password': 'new-password'})
+        assert response.status_code == 202
+        user.refresh_from_db()
+        assert user.check_password('new-password')
+
+    def test_anonymous(self):
+        with mock.patch.object(hashing, 'check_password') as check_password:
+            response = self.client.post(self.PATH, {'old_password': 'old', 'new_password': 'new-password'})
+        assert response.status_code == 403
+        assert not check_password.called
+
+
+@ignore_external
+@override_settings(USER_CACHE=dict(settings.USER_CACHE, CACHE='default'))
+class UserCacheTestCase(CreateMailTemplateMixin, APITestCase):
+    PATH = 'change_email/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_mail_template(EmailChange, EmailUpdated)
+
+    def setUp(self):
+        user_cache.get_shared().clear()
+
+    def test_cached(self):
+        user = UserFactory()
+        self.force_login(user)
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 200
+        assert user_cache.get_local().get(user.pk) is not None
+
+    def test_password_change_invalidates_sessions(self):
+        user = UserFactory()
+        self.force_login(user)
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 200
+
+        user.set_password('changed')
+        user.save()
+
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 403
+
+    def test_stale_local_entry(self):
+        user = UserFactory()
+        self.force_login(user)
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 200
+        stale = user_cache.get_local().get(user.pk)
+
+        user.set_password('changed')
+        user.save()
+        # the local tier of another process still holds the user from before the change
+        user_cache.get_local().set(user.pk, stale)
+
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 403
+
+    def test_inactive_cached(self):
+        user = UserFactory()
+        self.force_login(user)
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 200
+        version, cached = user_cache.get_local().get(user.pk)
+        cached = copy.copy(cached)
+        cached.is_active = False
+        user_cache.get_local().set(user.pk, (version, cached))
+
+        assert self.client.post(self.PATH, {'email': user.email}).status_code == 403
+
+
+# explicit transaction statements, BEGIN is implied by leaving autocommit and recorded as in_transaction
+TRANSACTION_SQL_RE = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.IGNORECASE)
+
+
+@ignore_external
+class TransactionPolicyTestCase(CreateMailTemplateMixin, TransactionTestCase):
+    """
+    runs outside the TestCase transaction, so the policies commit and roll back for real
+    """
+    client_class = JsonClient
+
+    def setUp(self):
+        self.create_mail_template(EmailConfirm, EmailChange, EmailUpdated, PasswordReset)
+
+    def transaction_statements(self, path, data=None):
+        """
+        queries of a request to {path} that ran in a transaction or control one
+        """
+        with record_queries() as queries:
+            response = self.client.post(path, data)
+        assert response.status_code < 400, response
+        assert queries
+        return [query['sql'] for query in queries
+                if query['in_transaction'] or TRANSACTION_SQL_RE.match(query['sql'])]
+
+    def test_atomic(self):
+        with pytest.raises(RuntimeError):
+            with transaction.request_policy(transaction.ATOMIC):
+                assert connection.in_atomic_block
+                UserFactory(email='rolled-back@example.org')
+                raise RuntimeError()
+        assert not User.objects.filter(email='rolled-back@example.org').exists()
+
+    def test_none(self):
+        with pytest.raises(RuntimeError):
+            with transaction.request_policy(transaction.NONE):
+                assert connection.get_autocommit() and not connection.in_atomic_block
+                UserFactory(email='committed@example.org')
+                raise RuntimeError()
+        assert User.objects.filter(email='committed@example.org').exists()
+
+    def test_none_endpoints(self):
+        self.client.force_login(UserFactory())
+        assert self.transaction_statements('logout/') == []
+
+        user = UserFactory(email_confirmed=False)
+        assert self.transaction_statements('resend_email_confirm/', {'email': user.email}) == []
+        assert self.transaction_statements('reset_password/', {'email': user.email}) == []
+
+    def test_signup_hashes_outside_transaction(self):
+        make_password = hashing.make_password
+        in_transaction = []
+
+        def record(password):
+            in_transaction.append(connection.in_atomic_block)
+            return make_password(password)
+
+        with mock.patch('project_name.hashing.make_password', record):
+            response = self.client.post('signup/', {
+                'email': 'signup@example.org', 'first_name': 'First', 'last_name': 'Last', 'password': 'secret',
+            })
+        assert response.status_code == 202
+        assert in_transaction == [False]
+
+    def test_block(self):
+        claim = EmailClaim.objects.claim
+        in_transaction = []
+
+        def record(email, user):
+            in_transaction.append(connection.in_atomic_block)
+            return claim(email, user)
+
+        self.client.force_login(UserFactory())
+        with mock.patch.object(EmailClaim.objects, 'claim', record):
+            assert self.client.post('change_email/', {'email': 'block@example.org'}).status_code == 200
+        assert in_transaction == [True]
+
+
+class TransactionPolicyDeclaredTestCase(SimpleTestCase):
+    def test_declared(self):
+        views = [view for view in vars(api).values()
+                 if isinstance(view, type) and issubclass(view, ApiView) and view is not ApiView]
+        assert views
+        for view in views:
+            assert issubclass(view, transaction.TransactionPolicyMixin), view
+            assert view.transaction_policy in transaction.POLICIES, view
+            assert isinstance(view.query_budget, int), view
+
+
+@ignore_external
+class QueryBudgetTestCase(APITestCase):
+    def test_exceeded(self):
+        user = UserFactory()
+        with mock.patch.object(api.ResetPassword, 'query_budget', 0):
+            with pytest.raises(AssertionError) as error:
+                self.client.post('reset_password/', {'email': user.email})
+        assert 'ResetPassword issued 1 queries, budget 0' in str(error.value)
+        assert 'project_name/api.py' in str(error.value)
+
+    def test_duplicates(self):
+        queries = [{'sql': 'SELECT 1', 'origin': ['project_name/api.py:1 in handle'], 'eager_task': False}] * 2
+        with pytest.raises(AssertionError) as error:
+            check_query_budget(api.ResetPassword, queries)
+        assert 'duplicates found' in str(error.value)
+        assert '1. DUPLICATE SELECT 1' in str(error.value)
+
+    def test_not_counted(self):
+        queries = [
+            {'sql': 'SAVEPOINT "s1"', 'origin': [], 'eager_task': False},
+            {'sql': 'SELECT 1', 'origin': [], 'eager_task': True},
+            {'sql': 'SELECT 2', 'origin': [], 'eager_task': False},
+        ]
+        check_query_budget(api.ResetPassword, queries)
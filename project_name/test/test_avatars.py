@@ -0,0 +1,76 @@
+import io
+from unittest import mock
+
+import pytest
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..avatars import AvatarError, AvatarFetchError, fetch_avatar
+from ..factories import UserFactory
+from ..models import User
+from ..thumbnails import decode_source
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+
+AVATAR_FETCH = {
+    'CONNECT_TIMEOUT': 1,
+    'READ_TIMEOUT': 1,
+    'MAX_SIZE': 1024,
+    'POOL_SIZE': 1,
+    'RETRY_DELAY': None,
+}
+
+
+def fake_response(status_code=200, chunks=(PNG,), headers=None):
+    response = mock.Mock(status_code=status_code, headers=headers or {'Content-Type': 'image/png'})
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+
+@override_settings(AVATAR_FETCH=AVATAR_FETCH)
+class FetchAvatarTestCase(SimpleTestCase):
+    def fetch(self, response):
+        with mock.patch('project_name.avatars.get_session') as get_session:
+            get_session.return_value.get.return_value = response
+            return fetch_avatar('https://example.org/pictures/me')
+
+    def test_valid(self):
+        with self.fetch(fake_response()) as avatar:
+            assert avatar.name == 'me.png'
+            assert avatar.read() == PNG
+
+    def test_too_large(self):
+        with pytest.raises(AvatarError):
+            self.fetch(fake_response(headers={'Content-Type': 'image/png', 'Content-Length': '4096'}))
+        with pytest.raises(AvatarError):
+            self.fetch(fake_response(chunks=[PNG] * 20))
+
+    def test_not_an_image(self):
+        with pytest.raises(AvatarError):
+            self.fetch(fake_response(headers={'Content-Type': 'text/html'}))
+        with pytest.raises(AvatarError):
+            self.fetch(fake_response(chunks=[b'<html></html>']))
+
+    def test_server_error(self):
+        with pytest.raises(AvatarFetchError):
+            self.fetch(fake_response(status_code=502))
+
+
+class DecodeSourceTestCase(SimpleTestCase):
+    def test_jpeg_draft(self):
+        data = io.BytesIO()
+        Image.new('RGB', (1200, 1200), 'red').save(data, 'JPEG')
+        image = decode_source(ContentFile(data.getvalue()), (300, 300))
+        assert image.size == (300, 300)
+
+
+class AvatarUrlsTestCase(TestCase):
+    def test_no_lookups(self):
+        urls = {'x80': '/media/x80.jpg', 'x300': '/media/x300.jpg'}
+        user = UserFactory()
+        user.update_avatar_urls(urls)
+
+        user = User.objects.get(pk=user.pk)
+        with self.assertNumQueries(0):
+            assert user.avatar == urls
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from robust.models import Task
+
+from .. import tasks
+from ..debounce import delay_once
+
+
+@override_settings(ROBUST_ALWAYS_EAGER=False)
+class DelayOnceTestCase(TestCase):
+    def test_collapsed(self):
+        first = delay_once(tasks.generate_avatar_thumbnails, timedelta(seconds=10), user_id=1)
+        second = delay_once(tasks.generate_avatar_thumbnails, timedelta(seconds=10), user_id=1)
+        other = delay_once(tasks.generate_avatar_thumbnails, timedelta(seconds=10), user_id=2)
+
+        assert first.pk == second.pk != other.pk
+        assert first.eta > timezone.now()
+        assert Task.objects.count() == 2
+
+    def test_after_run(self):
+        first = delay_once(tasks.generate_avatar_thumbnails, None, user_id=1)
+        first.mark_succeed()
+        second = delay_once(tasks.generate_avatar_thumbnails, None, user_id=1)
+        assert first.pk != second.pk
@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+
+import pytest
+from django.test import SimpleTestCase
+
+from project_conf import env
+
+ENV = '''
+export DOMAIN=local.example.com
+export WWW_DOMAIN=www-${DOMAIN}
+export DJANGO_DEBUG=yes
+export DEFAULT_FROM_EMAIL='Test <test@$DOMAIN>'
+
+if [[ -f .local-env ]]; then
+  source .local-env
+fi
+'''
+
+
+class EnvFileTestCase(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.write('.env', ENV)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir.name, name), 'w') as f:
+            f.write(content)
+
+    def test_parse(self):
+        values, files = env.read_env(self.dir.name)
+        assert values['WWW_DOMAIN'] == 'www-local.example.com'
+        assert values['DEFAULT_FROM_EMAIL'] == 'Test <test@$DOMAIN>'
+        assert os.path.join(self.dir.name, '.local-env') in files
+
+    def test_local_env(self):
+        self.write('.local-env', 'export DOMAIN="example.org"  # production\nexport EXTRA=$WWW_DOMAIN\n')
+        values, _ = env.read_env(self.dir.name)
+        assert values['DOMAIN'] == 'example.org'
+        assert values['EXTRA'] == 'www-local.example.com'
+
+    def test_escapes(self):
+        assert env.parse_value('"abc\\$def"', {}) == 'abc$def'
+        assert env.parse_value('"a\\\\b \\"c\\" \\n"', {}) == 'a\\b "c" \\n'
+        assert env.parse_value('p\\$ss\\ word', {}) == 'p$ss word'
+
+    def test_substituted_dollar(self):
+        assert env.parse_value('$HOME/x', {'HOME': '/r$t'}) == '/r$t/x'
+        assert env.parse_value('"${HOME}/x"', {'HOME': '/r$t'}) == '/r$t/x'
+
+    def test_unsupported(self):
+        self.write('.local-env', 'export DOMAIN=$(hostname)\n')
+        with pytest.raises(env.EnvSyntaxError):
+            env.read_env(self.dir.name)
+
+    def test_snapshot_stale(self):
+        _, files = env.read_env(self.dir.name)
+        snapshot = {'files': env.fingerprint(files), 'environ': {}, 'raw': {}}
+        self.write(env.SNAPSHOT_FILE, json.dumps(snapshot))
+        assert env.read_snapshot(self.dir.name) == snapshot
+
+        self.write('.local-env', 'export DOMAIN=example.org\n')
+        assert env.read_snapshot(self.dir.name) is None
+
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+from django.test import SimpleTestCase
+
+from ..hashing import HashingSaturated, InlineHashingService, PoolHashingService
+
+
+class HashingServiceTestCase(SimpleTestCase):
+    def test_inline(self):
+        service = InlineHashingService()
+        encoded = service.make_password('secret')
+        assert service.check_password('secret', encoded)
+        assert not service.check_password('wrong', encoded)
+        assert not service.check_password(None, encoded)
+
+    def test_pool(self):
+        service = PoolHashingService(workers=1, max_pending=2)
+        try:
+            encoded = service.make_password('secret')
+            assert service.check_password('secret', encoded)
+            assert service.stats() == {'pending': 0, 'max_pending': 2}
+        finally:
+            service.shutdown()
+
+    def test_saturated(self):
+        service = PoolHashingService(workers=1, max_pending=1)
+        service._slots.acquire()
+        with pytest.raises(HashingSaturated):
+            service.make_password('secret')
+
+    def test_timeout_keeps_slot(self):
+        service = PoolHashingService(workers=1, max_pending=1, timeout=0.05)
+        try:
+            with pytest.raises(HashingSaturated) as error:
+                service.submit(time.sleep, 0.5)
+            assert 'timed out' in str(error.value)
+            with pytest.raises(HashingSaturated) as error:
+                service.submit(time.sleep, 0)
+            assert 'full' in str(error.value)
+
+            # released once the timed out job finishes
+            deadline = time.monotonic() + 5
+            while not service._slots.acquire(blocking=False):
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+            service._slots.release()
+        finally:
+            service.shutdown()
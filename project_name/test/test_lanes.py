@@ -0,0 +1,27 @@
+import pytest
+from django.test import TestCase
+
+from .. import tasks
+from ..enqueue import build_task, create_tasks
+from ..lanes import lane, next_tasks
+
+
+class LanesTestCase(TestCase):
+    def create_task(self, task):
+        return create_tasks([build_task(task, {})])[0]
+
+    def test_declared(self):
+        assert tasks.mail.mail_password_reset.tags == lane('auth')
+        assert tasks.generate_avatar_thumbnails.tags == lane('bulk')
+        assert lane('default') == []
+        with pytest.raises(ValueError):
+            lane('unknown')
+
+    def test_priority(self):
+        thumbs = self.create_task(tasks.generate_avatar_thumbnails)
+        signup = self.create_task(tasks.mail.mail_signup_completed)
+        reset = self.create_task(tasks.mail.mail_password_reset)
+
+        assert next_tasks(['bulk', 'default', 'auth'], limit=2) == [reset, signup]
+        assert next_tasks(['default']) == [signup]
+        assert next_tasks(['bulk']) == [thumbs]
@@ -0,0 +1,53 @@
+import pytest
+from django.test import SimpleTestCase, override_settings
+
+from .utils import APITestCase, ignore_external
+from .. import loadtest
+from ..models import User
+
+
+class CompareTestCase(SimpleTestCase):
+    baseline = {'signin': {'p50': 10, 'p95': 20, 'p99': 30, 'throughput': 100, 'queries': 4, 'cpu': 5}}
+
+    def test_within_threshold(self):
+        results = {'signin': dict(self.baseline['signin'], p95=21, throughput=95)}
+        assert loadtest.compare(results, self.baseline, 0.1) == []
+
+    def test_regressed(self):
+        results = {'signin': dict(self.baseline['signin'], queries=6, throughput=50)}
+        regressions = loadtest.compare(results, self.baseline, 0.1)
+        assert [line.split(':')[0] for line in regressions] == ['signin throughput', 'signin queries']
+
+    def test_new_scenario(self):
+        assert loadtest.compare({'signup': self.baseline['signin']}, self.baseline, 0.1) == []
+
+
+class SummarizeTestCase(SimpleTestCase):
+    def test_errors(self):
+        samples = [(200, 0.01, 2, 0.001), (302, 0.01, 2, 0.001), (400, 0.001, 1, 0), (503, 0.1, 0, 0), (None, 1, 0, 0)]
+        stats = loadtest.summarize(samples, 1, pool_cpu=0.002)
+        assert stats['requests'] == 5
+        assert stats['errors'] == 3
+        assert stats['throughput'] == 2
+        assert stats['cpu'] == 2
+
+
+@ignore_external
+@override_settings(RATELIMIT_SKIP=True)
+class RunTestCase(APITestCase):
+    def test_scenarios(self):
+        seed = loadtest.seed_users(3, 4)
+        for name in loadtest.SCENARIOS:
+            stats = loadtest.run(name, seed, 4, 1)
+            assert stats['requests'] == 4
+            assert stats['errors'] == 0, name
+            assert stats['queries'] > 0, name
+
+    def test_email_confirm_once(self):
+        seed = loadtest.seed_users(1, 2)
+        unconfirmed = list(seed.unconfirmed)
+        assert loadtest.run('email_confirm', seed, 2, 1)['errors'] == 0
+        assert User.objects.filter(pk__in=[user.pk for user in unconfirmed], email_confirmed=True).count() == 2
+
+        with pytest.raises(ValueError):
+            loadtest.run('email_confirm', seed, 1, 1)
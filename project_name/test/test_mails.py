@@ -0,0 +1,128 @@
+import pytest
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from happymailer.backends import Backend
+from robust.runners import SimpleRunner
+
+from .utils import CreateMailTemplateMixin, ignore_external
+from .. import mjml_cache, signals, tasks
+from ..enqueue import build_task, create_tasks
+from ..factories import UserFactory
+from ..mails import EmailUpdated, SignupCompleted, TemplateException, batch
+from ..worker import LaneWorkerThread, mail_user_ids
+
+
+class CountingBackend(Backend):
+    calls = 0
+
+    def compile(self, source):
+        CountingBackend.calls += 1
+        return source
+
+
+@ignore_external
+@override_settings(HAPPYMAILER_BACKEND='project_name.test.test_mails.CountingBackend')
+class MjmlCacheTestCase(CreateMailTemplateMixin, TestCase):
+    def setUp(self):
+        mjml_cache.invalidate()
+        CountingBackend.calls = 0
+
+    def test_compiled_once(self):
+        self.create_mail_template(SignupCompleted, body='<mj-text>Hello {{ user.first_name }}</mj-text>')
+        first, second = UserFactory(first_name='Lydia'), UserFactory(first_name='<Adam>')
+
+        assert 'Hello Lydia' in SignupCompleted(user_id=first.pk).compile()
+        assert 'Hello &lt;Adam&gt;' in SignupCompleted(user_id=second.pk).compile()
+        assert CountingBackend.calls == 1
+
+    def test_invalidated_on_edit(self):
+        model, = self.create_mail_template(SignupCompleted, body='<mj-text>Hello {{ user.first_name }}</mj-text>')
+        user = UserFactory(first_name='Lydia')
+        SignupCompleted(user_id=user.pk).compile()
+
+        model.body = '<mj-text>Bye {{ user.first_name }}</mj-text>'
+        model.save()
+
+        assert 'Bye Lydia' in SignupCompleted(user_id=user.pk).compile()
+        assert CountingBackend.calls == 2
+
+    def test_uncacheable(self):
+        self.create_mail_template(SignupCompleted, body='<mj-text>{{ user.first_name|upper }}</mj-text>')
+        user = UserFactory(first_name='Lydia')
+
+        assert 'LYDIA' in SignupCompleted(user_id=user.pk).compile()
+        assert 'LYDIA' in SignupCompleted(user_id=user.pk).compile()
+        assert CountingBackend.calls == 2
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+@ignore_external
+@override_settings(HAPPYMAILER_BACKEND='project_name.test.test_mails.CountingBackend',
+                   EMAIL_BACKEND='project_name.test.test_mails.CountingEmailBackend')
+class MailBatchTestCase(CreateMailTemplateMixin, TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    def test_batch(self):
+        self.create_mail_template(SignupCompleted, EmailUpdated)
+        users = UserFactory.create_batch(3)
+        batches = []
+
+        def mail_batch_sent(size, sent, **kwargs):
+            batches.append((size, sent))
+
+        signals.mail_batch_sent.connect(mail_batch_sent)
+        self.addCleanup(signals.mail_batch_sent.disconnect, mail_batch_sent)
+
+        with batch([user.pk for user in users]):
+            with CaptureQueriesContext(connection) as queries:
+                for user in users:
+                    SignupCompleted(user_id=user.pk).send()
+                EmailUpdated(user_id=users[0].pk).send()
+
+        assert not [query for query in queries if 'project_name_user' in query['sql']]
+        assert len(mail.outbox) == 4
+        assert CountingEmailBackend.opened == 1
+        assert batches == [(4, 4)]
+
+    def test_unknown_user(self):
+        self.create_mail_template(EmailUpdated)
+        user = UserFactory()
+        with batch([user.pk, 0]):
+            EmailUpdated(user_id=user.pk).send()
+            with pytest.raises(TemplateException):
+                EmailUpdated(user_id=0)
+        assert [message.to for message in mail.outbox] == [[user.email_recipient]]
+
+    def test_worker_chunk(self):
+        chunk = [build_task(tasks.mail.mail_updated_email, {'user_id': 1}),
+                 build_task(tasks.generate_avatar_thumbnails, {'user_id': 2}),
+                 build_task(tasks.mail.mail_password_reset, {'user_id': 3})]
+        assert mail_user_ids(chunk) == [1, 3]
+
+    def test_worker_drain(self):
+        self.create_mail_template(SignupCompleted, EmailUpdated)
+        users = UserFactory.create_batch(3)
+        create_tasks([build_task(tasks.mail.mail_signup_completed, {'user_id': user.pk}) for user in users] +
+                     [build_task(tasks.mail.mail_updated_email, {'user_id': users[0].pk})])
+        thread = LaneWorkerThread(0, SimpleRunner, 10, None, list(settings.ROBUST_LANES))
+
+        with CaptureQueriesContext(connection) as queries:
+            assert len(thread.run_chunk()) == 4
+
+        user_queries = [query for query in queries
+                        if query['sql'].startswith('SELECT') and 'FROM "project_name_user"' in query['sql']]
+        assert len(user_queries) == 1
+        assert len(mail.outbox) == 4
+        assert CountingEmailBackend.opened == 1
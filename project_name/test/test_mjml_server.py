@@ -0,0 +1,45 @@
+import sys
+
+import pytest
+from django.test import SimpleTestCase
+from happymailer.backends import CompileError
+
+from ..mjml_server import MjmlServerPool
+
+# stands in for mjml_server.js: echoes the source back as html
+ECHO_SERVER = '''
+import json, sys
+for line in sys.stdin:
+    request = json.loads(line)
+    if request.get('ping'):
+        response = {'id': request['id'], 'pong': True}
+    elif request['mjml'] == 'crash':
+        sys.exit(1)
+    elif request['mjml'] == 'invalid':
+        response = {'id': request['id'], 'error': 'invalid mjml'}
+    else:
+        response = {'id': request['id'], 'html': request['mjml'].upper(), 'errors': []}
+    sys.stdout.write(json.dumps(response) + '\\n')
+    sys.stdout.flush()
+'''
+
+
+class MjmlServerPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pool = MjmlServerPool([sys.executable, '-c', ECHO_SERVER], processes=2, timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_compile(self):
+        assert self.pool.compile('<mjml></mjml>') == '<MJML></MJML>'
+        assert self.pool.health() == [True, True]
+
+    def test_error(self):
+        with pytest.raises(CompileError):
+            self.pool.compile('invalid')
+
+    def test_restart_on_crash(self):
+        with pytest.raises(CompileError):
+            self.pool.compile('crash')
+        assert self.pool.compile('<mjml></mjml>') == '<MJML></MJML>'
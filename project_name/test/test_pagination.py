@@ -0,0 +1,24 @@
+from django.test import TestCase
+
+from ..factories import UserFactory
+from ..models import User
+from ..pagination import EstimatedCountPaginator
+
+
+class DeferredJoinPaginator(EstimatedCountPaginator):
+    DEFERRED_JOIN_OFFSET = 0
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    def test_exact_below_threshold(self):
+        UserFactory.create_batch(3)
+        paginator = EstimatedCountPaginator(User.objects.order_by('-pk'), 2)
+        assert paginator.count == 3
+        assert paginator.num_pages == 2
+
+    def test_deferred_join(self):
+        UserFactory.create_batch(5)
+        queryset = User.objects.order_by('-date_joined', '-pk')
+        paginator = DeferredJoinPaginator(queryset, 2)
+        assert list(paginator.page(2).object_list) == list(queryset[2:4])
+        assert len(paginator.page(3).object_list) == 1
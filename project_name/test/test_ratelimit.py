@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+
+from ..ratelimit import SlidingWindowLimiter
+
+
+class SlidingWindowLimiterTestCase(SimpleTestCase):
+    def test_limit(self):
+        limiter = SlidingWindowLimiter()
+        assert limiter.hit('a', 2, 60, now=0)
+        assert limiter.hit('a', 2, 60, now=1)
+        assert not limiter.hit('a', 2, 60, now=2)
+        # the previous window weighs fully at its end, then fades out
+        assert not limiter.hit('a', 2, 60, now=60)
+        assert limiter.hit('a', 2, 60, now=90)
+        assert limiter.hit('a', 2, 60, now=150)
+
+    def test_eviction_mixed_periods(self):
+        limiter = SlidingWindowLimiter(max_keys=10)
+        assert limiter.hit('signup:ip:attacker', 1, 3600, now=0)
+        assert limiter.hit('signin:email:old', 1, 60, now=0)
+
+        # minute keys filling the table an hour window later
+        for index in range(20):
+            limiter.hit('signin:email:{}'.format(index), 5, 60, now=200 + index)
+            assert not limiter.hit('signup:ip:attacker', 1, 3600, now=200 + index)
+
+        assert 'signin:email:old' not in limiter._windows
+        assert len(limiter._windows) <= 10
+
+    def test_expired_first(self):
+        limiter = SlidingWindowLimiter(max_keys=3)
+        limiter.hit('hour', 5, 3600, now=0)
+        limiter.hit('minute', 5, 60, now=1)
+        limiter.hit('recent', 5, 60, now=150)
+        limiter.hit('new', 5, 60, now=151)
+        assert list(limiter._windows) == ['hour', 'recent', 'new']
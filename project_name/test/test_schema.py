@@ -0,0 +1,161 @@
+import hashlib
+import json
+from unittest import mock
+
+import pytest
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .. import api
+from ..management.commands.benchmark_schemas import CASES, build_request, view_path
+from ..factories import UserFactory
+from ..models import User
+from ..schema import CompiledSpecMixin, RequestParseError, compile_serializer, node_of
+from .utils import APITestCase, ignore_external
+
+
+def valid_value(node, query=False):
+    kind = node[0]
+    if kind in ('object', 'query'):
+        return {name: valid_value(field, query or kind == 'query') for name, field in node[1].items()}
+    if kind == 'optional':
+        return valid_value(node[1], query)
+    if kind == 'array':
+        return [valid_value(node[1], query)]
+    if kind == 'integer':
+        return '42' if query else 42
+    return 'lydia@example.org'
+
+
+def samples(node):
+    """
+    a valid request for the {node} of a view and its variations around what the compiled validators accept
+    """
+    valid = valid_value(node)
+    if node[0] == 'query':
+        yield valid
+        yield dict(valid, extra='1')
+        for name, field in node[1].items():
+            yield {key: value for key, value in valid.items() if key != name}
+            kind = field[1][0] if field[0] == 'optional' else field[0]
+            if kind == 'integer':
+                for value in ('', 'x', '-1', ' 1', '1.0', '007', '\u0661', '9' * 30):
+                    yield dict(valid, **{name: value})
+        return
+
+    yield valid
+    for data in (None, [], 'x', 1, dict(valid, extra=1)):
+        yield data
+    for name, field in node[1].items():
+        yield {key: value for key, value in valid.items() if key != name}
+        yield dict(valid, **{name: None})
+        kind = field[1][0] if field[0] == 'optional' else field[0]
+        for value in {'string': (1, True, ['x'], {}), 'integer': ('1', 1.0, True, None)}.get(kind, ()):
+            yield dict(valid, **{name: value})
+
+
+def request_views():
+    return [value for value in vars(api).values()
+            if isinstance(value, type) and issubclass(value, CompiledSpecMixin) and value is not CompiledSpecMixin
+            and value.compiled_request.node[0] != 'empty']
+
+
+class CompiledSchemaTestCase(SimpleTestCase):
+    def test_every_view_compiled(self):
+        views = [value for value in vars(api).values()
+                 if isinstance(value, type) and issubclass(value, CompiledSpecMixin) and value is not CompiledSpecMixin]
+        assert views
+        for view in views:
+            assert view.compiled_request is not None, view
+
+    def test_request_body(self):
+        parse = api.Signin.compiled_request.parse
+        data = {'email': 'lydia@example.org', 'password': 'p'}
+        factory = RequestFactory()
+        assert parse(factory.post('/api/signin/', json.dumps(data), content_type='application/json')) == data
+        for request in (factory.post('/api/signin/', '', content_type='application/json'),
+                        factory.post('/api/signin/', json.dumps(data), content_type='text/plain'),
+                        factory.post('/api/signin/', data)):
+            with pytest.raises(RequestParseError):
+                parse(request)
+        with pytest.raises(RequestParseError):
+            api.EmailConfirm.compiled_request.parse(factory.get('/api/email_confirm/?id=1&id=2&code=c'))
+
+
+@ignore_external
+class LibraryParityTestCase(APITestCase):
+    """
+    every request the compiled validator of a view takes, the api library takes too
+    and passes the same data to handle()
+    """
+
+    def setUp(self):
+        self.force_login(UserFactory(email_confirmed=True))
+
+    def library_parse(self, view, data):
+        path = view_path(view.__name__)
+        with override_settings(API_COMPILED_SCHEMAS=False), \
+                mock.patch.object(view, 'handle', return_value=204) as handle:
+            if view.compiled_request.node[0] == 'query':
+                self.client.get(path, data)
+            else:
+                self.client.generic(view.compiled_request.method, path, json.dumps(data),
+                                    content_type='application/json')
+        return handle.call_args[0][-1] if handle.called else RequestParseError
+
+    def compiled_parse(self, view, data):
+        try:
+            return view.compiled_request.parse(build_request(view, data))
+        except RequestParseError:
+            return RequestParseError
+
+    def test_matches_library(self):
+        views = request_views()
+        assert views
+        for view in views:
+            node = view.compiled_request.node
+            cases = list(samples(node)) + list(CASES.get(view.__name__, {}).values())
+            for data in cases:
+                with self.subTest(view=view.__name__, data=data):
+                    compiled = self.compiled_parse(view, data)
+                    if compiled is not RequestParseError:
+                        assert compiled == self.library_parse(view, data)
+            # the fast path is taken for well-formed requests
+            assert self.compiled_parse(view, valid_value(node)) is not RequestParseError, view
+
+
+class CompiledSerializerTestCase(SimpleTestCase):
+    def test_matches_json(self):
+        serialize = compile_serializer(node_of(api.UserDef))
+        for avatar in (None, 'https://example.org/a.png'):
+            data = {'id': 1, 'email': 'l\u00f6ydia@example.org', 'first_name': 'Lydia "L"',
+                    'short_name': 'Lydia', 'avatar': avatar}
+            assert json.loads(serialize(data)) == data
+
+        errors = {'errors': ['Wrong password', 'Too many requests']}
+        assert json.loads(compile_serializer(node_of(api.Errors))(errors)) == errors
+
+    def test_projection(self):
+        user = User(pk=7, email='lydia@example.org', first_name='Lydia', avatar_urls={'x300': '/a.png'})
+        expected = {'id': 7, 'email': 'lydia@example.org', 'first_name': 'Lydia',
+                    'short_name': user.get_short_name(), 'avatar': '/a.png'}
+        assert api.UserProjection.as_dict(user) == expected
+        assert json.loads(api.UserProjection.serialize(user)) == expected
+
+    def test_fallback_dict(self):
+        user = User(pk=1, email='a@b.c', first_name='A')
+        assert api.Signin().project(api.UserProjection, user) == api.UserProjection.as_dict(user)
+
+
+@ignore_external
+class CompiledResponseTestCase(APITestCase):
+    def test_signin(self):
+        user = UserFactory(email_confirmed=True)
+        response = self.client.post('signin/', {'email': user.email, 'password': user._password})
+        assert response.status_code == 200
+        assert response.json()['id'] == user.pk
+        assert response['ETag'] == '"{}"'.format(hashlib.md5(response.content).hexdigest())
+
+        with override_settings(API_COMPILED_SCHEMAS=False):
+            plain = self.client.post('signin/', {'email': user.email, 'password': user._password})
+        assert (plain.status_code, plain['Content-Type'], plain.json()) == \
+            (response.status_code, response['Content-Type'], response.json())
@@ -0,0 +1,31 @@
+from django.test import TestCase
+
+from ..factories import UserFactory
+from ..models import User
+from ..search import search_users
+
+
+class SearchUsersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lydia = UserFactory(first_name='Lydia', last_name='Deetz', email='lydia@example.org')
+        cls.adam = UserFactory(first_name='Adam', last_name='Maitland', email='adam@example.org')
+
+    def search(self, term):
+        return set(search_users(User.objects.all(), term))
+
+    def test_name(self):
+        assert self.search('deetz') == {self.lydia}
+        assert self.search('ADAM mait') == {self.adam}
+
+    def test_email_prefix(self):
+        assert self.search('Lydia@exa') == {self.lydia}
+
+    def test_email_fragment(self):
+        assert self.search('@example.org') == {self.lydia, self.adam}
+        assert self.search('@EXAMPLE') == {self.lydia, self.adam}
+        assert self.search('example.org') == {self.lydia, self.adam}
+
+    def test_like_escaping(self):
+        assert self.search('%') == set()
+        assert self.search('') == {self.lydia, self.adam}
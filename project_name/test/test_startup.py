@@ -0,0 +1,17 @@
+from django.test import SimpleTestCase
+
+from ..management.commands.benchmark_startup import parse_importtime
+
+IMPORTTIME = '''import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _json
+import time:       800 |       1500 | json
+import time:       300 |        300 |     django.utils.version
+import time:      2000 |       9000 | django
+import time:       500 |       1000 | django.db
+'''
+
+
+class ParseImportTimeTestCase(SimpleTestCase):
+    def test_top_level(self):
+        totals = parse_importtime(IMPORTTIME.splitlines())
+        assert totals == {'json': 0.0015, 'django': 0.01}
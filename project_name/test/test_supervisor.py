@@ -0,0 +1,47 @@
+import signal
+from unittest import mock
+
+import pytest
+from django.test import SimpleTestCase
+
+from ..supervisor import Supervisor, _run_beat
+
+
+class SupervisorScaleTestCase(SimpleTestCase):
+    def supervisor(self, **kwargs):
+        return Supervisor({}, min_workers=1, max_workers=4, backlog=10, max_age=30, **kwargs)
+
+    def test_depth(self):
+        supervisor = self.supervisor()
+        assert supervisor.desired(0, 0) == 1
+        assert supervisor.desired(25, 1) == 3
+        assert supervisor.desired(1000, 1) == 4
+
+    def test_age(self):
+        supervisor = self.supervisor()
+        supervisor.workers = [object(), object()]
+        assert supervisor.desired(1, 60) == 3
+
+    def test_bounds(self):
+        with pytest.raises(ValueError):
+            Supervisor({}, min_workers=3, max_workers=2)
+
+
+class SupervisorChildTestCase(SimpleTestCase):
+    def test_beat_signals(self):
+        handlers = {}
+
+        def run_beat():
+            handlers.update({signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)})
+
+        saved = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+        supervisor = Supervisor({}, min_workers=1, max_workers=1)
+        signal.signal(signal.SIGINT, supervisor.stop)
+        signal.signal(signal.SIGTERM, supervisor.stop)
+        try:
+            with mock.patch('robust.beat.run_beat', run_beat):
+                _run_beat()
+        finally:
+            for signum, handler in saved.items():
+                signal.signal(signum, handler)
+        assert handlers == {signal.SIGINT: signal.SIG_DFL, signal.SIGTERM: signal.SIG_DFL}
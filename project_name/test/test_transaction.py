@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.db import transaction as db_transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from robust.models import Task, TaskEvent
+
+from .. import tasks, transaction
+
+
+@override_settings(ROBUST_ALWAYS_EAGER=False)
+class BulkDelayTestCase(TestCase):
+    def test_bulk_delay(self):
+        transaction.bulk_delay([
+            (tasks.mail.mail_updated_email, {'user_id': 1}),
+            (tasks.mail.mail_password_reset, {'user_id': 2}),
+        ])
+        assert list(Task.objects.order_by('pk').values_list('name', 'payload')) == [
+            ('project_name.tasks.mail.mail_updated_email', {'user_id': 1}),
+            ('project_name.tasks.mail.mail_password_reset', {'user_id': 2}),
+        ]
+        assert TaskEvent.objects.count() == 2
+
+
+# on_commit hooks only run on a real commit
+@override_settings(ROBUST_ALWAYS_EAGER=False)
+class OnCommitTestCase(TransactionTestCase):
+    def test_coalesced(self):
+        with mock.patch('project_name.transaction.bulk_delay') as bulk_delay:
+            with transaction.atomic():
+                transaction.on_commit(tasks.mail.mail_updated_email.delay, user_id=1)
+                with transaction.atomic():
+                    transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=2)
+                assert not bulk_delay.called
+
+        bulk_delay.assert_called_once_with([
+            (tasks.mail.mail_updated_email, {'user_id': 1}),
+            (tasks.mail.mail_password_reset, {'user_id': 2}),
+        ])
+
+    def test_savepoint_rollback(self):
+        with mock.patch('project_name.transaction.bulk_delay') as bulk_delay:
+            with transaction.atomic():
+                transaction.on_commit(tasks.mail.mail_updated_email.delay, user_id=1)
+                try:
+                    with transaction.atomic():
+                        transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=2)
+                        raise ValueError()
+                except ValueError:
+                    pass
+
+        bulk_delay.assert_called_once_with([(tasks.mail.mail_updated_email, {'user_id': 1})])
+
+    def test_rollback(self):
+        with mock.patch('project_name.transaction.bulk_delay') as bulk_delay:
+            try:
+                with transaction.atomic():
+                    transaction.on_commit(tasks.mail.mail_updated_email.delay, user_id=1)
+                    raise ValueError()
+            except ValueError:
+                pass
+            with transaction.atomic():
+                transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=2)
+
+        bulk_delay.assert_called_once_with([(tasks.mail.mail_password_reset, {'user_id': 2})])
+
+    def test_outside_batch(self):
+        with db_transaction.atomic():
+            transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=2)
+            assert not Task.objects.exists()
+
+        assert list(Task.objects.values_list('name', 'payload')) == [
+            ('project_name.tasks.mail.mail_password_reset', {'user_id': 2}),
+        ]
+
+    @override_settings(ROBUST_ALWAYS_EAGER=True)
+    def test_eager(self):
+        with mock.patch.object(tasks.mail.mail_password_reset, 'fn') as fn:
+            with transaction.atomic():
+                transaction.on_commit(tasks.mail.mail_password_reset.delay, user_id=2)
+                fn.assert_called_once_with(user_id=2)
@@ -1,13 +1,20 @@
 import json
 import os
+import re
+import traceback
 import types
+from collections import Counter, deque
+from contextlib import contextmanager
 from functools import wraps
 
 import pytest
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.serializers.json import DjangoJSONEncoder
 from django.test import override_settings, TestCase
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test.client import Client
+from django.urls import Resolver404, resolve
 from django.utils.http import urlencode
 from happymailer.models import TemplateModel
 
@@ -29,7 +36,88 @@ ignore_external = override_settings(
 )
 
 
+# savepoints depend on the surrounding transactions, not on the endpoint
+TRANSACTION_CONTROL_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+def query_origin(stack):
+    """
+    frames of {stack} in the project code, innermost last
+    """
+    origin = []
+    for frame in stack:
+        if frame.filename == __file__:
+            continue
+        filename = os.path.relpath(frame.filename, settings.BASE_DIR)
+        if filename.startswith('..') or 'site-packages' in filename:
+            continue
+        origin.append('{}:{} in {}'.format(filename, frame.lineno, frame.name))
+    return origin
+
+
+class QueryLog(deque):
+    """
+    connection.queries_log also recording where each query was issued from,
+    whether it ran inside a task executed eagerly by robust and inside a transaction
+    """
+    connection = None
+
+    def append(self, query):
+        stack = traceback.extract_stack()[:-1]
+        query['origin'] = query_origin(stack)
+        query['eager_task'] = any(frame.name == 'delay_with_task_kwargs' for frame in stack)
+        query['in_transaction'] = self.connection is not None and not self.connection.get_autocommit()
+        super().append(query)
+
+
+@contextmanager
+def record_queries(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    saved_log, saved_force_debug_cursor = connection.queries_log, connection.force_debug_cursor
+    connection.queries_log = log = QueryLog(maxlen=connection.queries_limit)
+    log.connection = connection
+    connection.force_debug_cursor = True
+    try:
+        yield log
+    finally:
+        connection.queries_log, connection.force_debug_cursor = saved_log, saved_force_debug_cursor
+        # an enclosing CaptureQueriesContext still sees every query
+        saved_log.extend(log)
+
+
+def check_query_budget(view, queries):
+    """
+    raises AssertionError when {view} issued more queries than its query_budget or the same query twice,
+    transaction control statements and queries of eagerly executed tasks are not counted
+    """
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        return
+
+    counted = [query for query in queries
+               if not query['eager_task'] and not TRANSACTION_CONTROL_RE.match(query['sql'])]
+    duplicates = {sql for sql, count in Counter(query['sql'] for query in counted).items() if count > 1}
+    if len(counted) <= budget and not duplicates:
+        return
+
+    lines = ['{} issued {} queries, budget {}{}'.format(
+        view.__name__, len(counted), budget, ', duplicates found' if duplicates else '')]
+    for index, query in enumerate(counted, 1):
+        lines.append('{}.{} {}'.format(index, ' DUPLICATE' if query['sql'] in duplicates else '', query['sql']))
+        lines.extend('      {}'.format(frame) for frame in query['origin'])
+    raise AssertionError('\n'.join(lines))
+
+
 class JsonClient(Client):
+    # check ApiView.query_budget on every request
+    check_query_budgets = True
+
+    def _resolve_view(self, path):
+        try:
+            return getattr(resolve(path).func, 'view_class', None)
+        except Resolver404:
+            return None
+
     def _make_path(self, path):
         if not path.startswith('/api/'):
             return '{}{}'.format(API_BASE_PATH, path)
@@ -44,8 +132,12 @@ class JsonClient(Client):
                 extra = {'data': data_str, **extra}
             else:
                 extra = {'QUERY_STRING': urlencode(data, doseq=True), **extra}
-        response = self.generic(method, self._make_path(path), secure=secure,
-                                content_type='application/json', **extra)
+        path = self._make_path(path)
+        view = self._resolve_view(path) if self.check_query_budgets else None
+        with record_queries() as queries:
+            response = self.generic(method, path, secure=secure, content_type='application/json', **extra)
+        if view is not None:
+            check_query_budget(view, queries)
         return response
 
     def delete(self, path, data=None, secure=False, **extra):
@@ -0,0 +1,66 @@
+import io
+import logging
+
+from PIL import Image
+from easy_thumbnails import utils
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+
+__all__ = ('decode_source', 'generate_aliases')
+
+logger = logging.getLogger(__name__)
+
+
+def decode_source(fieldfile, size):
+    """
+    decode the source image once, letting JPEG decoder downscale
+    to the smallest power of two reduction still covering {size}
+    """
+    fieldfile.open('rb')
+    try:
+        image = Image.open(io.BytesIO(fieldfile.read()))
+    finally:
+        fieldfile.close()
+
+    if image.format == 'JPEG':
+        image.draft(image.mode, size)
+    image.load()
+    return utils.exif_orientation(image)
+
+
+def generate_aliases(fieldfile, force=False):
+    """
+    generate missing or outdated thumbnail aliases of {fieldfile}
+    from a single decoded source image, returns {alias: url} of all aliases
+    """
+    if not fieldfile:
+        return {}
+
+    thumbnailer = get_thumbnailer(fieldfile)
+    urls = {}
+    missing = {}
+    for alias, options in aliases.all(fieldfile, include_global=False).items():
+        options = dict(options, ALIAS=alias)
+        thumbnail = None if force else thumbnailer.get_existing_thumbnail(options)
+        if thumbnail:
+            urls[alias] = thumbnail.url
+        else:
+            missing[alias] = options
+
+    if not missing:
+        return urls
+
+    size = (
+        max(options['size'][0] for options in missing.values()),
+        max(options['size'][1] for options in missing.values()),
+    )
+    image = decode_source(fieldfile, size)
+    thumbnailer.source_generators = [lambda source, **kwargs: image.copy()]
+
+    for alias, options in missing.items():
+        thumbnail = thumbnailer.generate_thumbnail(options)
+        thumbnailer.save_thumbnail(thumbnail)
+        urls[alias] = thumbnail.url
+
+    logger.debug('generated %s for %s', ', '.join(sorted(missing)), fieldfile.name)
+    return urls
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+__all__ = ('email_confirm', 'new_email_confirm', 'password_reset')
+
+
+class TokenGenerator:
+    """
+    signed, expiring tokens bound to the user state they were issued for,
+    the token stops working as soon as that state changes, so nothing is stored
+    """
+    salt = None
+    max_age_setting = None
+
+    def get_state(self, user):
+        raise NotImplementedError()
+
+    def _digest(self, user):
+        value = '{}:{}'.format(user.pk, self.get_state(user))
+        return salted_hmac(self.salt, value).hexdigest()[::2]
+
+    def make_token(self, user):
+        return signing.dumps([user.pk, self._digest(user)], salt=self.salt)
+
+    def get_user_id(self, token):
+        max_age = getattr(settings, self.max_age_setting)
+        try:
+            user_id, _ = signing.loads(token, salt=self.salt, max_age=max_age.total_seconds())
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        return user_id
+
+    def check_token(self, user, token):
+        if not token or self.get_user_id(token) != user.pk:
+            return False
+        _, digest = signing.loads(token, salt=self.salt)
+        return constant_time_compare(digest, self._digest(user))
+
+
+class EmailConfirmTokenGenerator(TokenGenerator):
+    salt = 'project_name.tokens.email_confirm'
+    max_age_setting = 'EMAIL_CONFIRM_TOKEN_MAX_AGE'
+
+    def get_state(self, user):
+        return '{}:{}'.format(user.email, user.email_confirmed)
+
+
+class NewEmailConfirmTokenGenerator(TokenGenerator):
+    salt = 'project_name.tokens.new_email_confirm'
+    max_age_setting = 'EMAIL_CONFIRM_TOKEN_MAX_AGE'
+
+    def get_state(self, user):
+        return '{}:{}'.format(user.email, user.new_email)
+
+
+class PasswordResetTokenGenerator(TokenGenerator):
+    salt = 'project_name.tokens.password_reset'
+    max_age_setting = 'PASSWORD_RESET_TOKEN_MAX_AGE'
+
+    def get_state(self, user):
+        login_timestamp = user.last_login.replace(microsecond=0, tzinfo=None) if user.last_login else ''
+        return '{}:{}'.format(user.password, login_timestamp)
+
+
+email_confirm = EmailConfirmTokenGenerator()
+new_email_confirm = NewEmailConfirmTokenGenerator()
+password_reset = PasswordResetTokenGenerator()
@@ -1,19 +1,100 @@
 import contextlib
+import threading
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 
-__all__ = ('on_commit',)
+from .enqueue import build_task, create_tasks
+
+__all__ = ('on_commit', 'bulk_delay', 'atomic', 'NONE', 'ATOMIC', 'BLOCK', 'TransactionPolicyMixin')
+
+# request transaction policies, see TransactionPolicyMixin
+NONE = 'none'  # autocommit, every statement commits on its own, the view's writes don't depend on each other
+ATOMIC = 'atomic'  # the whole view runs in one transaction
+BLOCK = 'block'  # autocommit, the view wraps its writes in atomic() itself
+
+POLICIES = (NONE, ATOMIC, BLOCK)
+
+
+_batch = threading.local()
+
+
+def is_task_delay(fn):
+    from robust.models import TaskWrapper
+    owner = getattr(fn, '__self__', None)
+    return isinstance(owner, type) and issubclass(owner, TaskWrapper) and \
+        getattr(fn, '__func__', None) is TaskWrapper.delay.__func__
+
+
+def bulk_delay(calls):
+    """
+    robust .delay() of many (task, kwargs) {calls} at once
+    """
+    return create_tasks([build_task(task, kwargs) for task, kwargs in calls])
+
+
+def _collect(task, kwargs):
+    _batch.calls.append((task, kwargs))
+
+
+def _flush():
+    calls, _batch.calls = _batch.calls, []
+    bulk_delay(calls)
 
 
 def on_commit(fn, *args, **kwargs):
     if settings.ROBUST_ALWAYS_EAGER:
         fn(*args, **kwargs)
+    elif getattr(_batch, 'active', False) and connection.in_atomic_block and not args and is_task_delay(fn):
+        # collected on commit, a rolled back savepoint drops the call,
+        # atomic() registers the flush after every call of its block
+        _batch.pending += 1
+        transaction.on_commit(lambda: _collect(fn.__self__, kwargs))
     else:
         transaction.on_commit(lambda: fn(*args, **kwargs))
 
 
 @contextlib.contextmanager
-def atomic():
-    with transaction.atomic():
-        yield
+def atomic(using=None):
+    """
+    transaction.atomic(), task delays passed to on_commit() inside the outermost one
+    are inserted together once it commits
+    """
+    if getattr(_batch, 'active', False):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    _batch.active, _batch.pending, _batch.calls = True, 0, []
+    try:
+        with transaction.atomic(using=using):
+            yield
+            if _batch.pending:
+                transaction.on_commit(_flush, using=using)
+    finally:
+        _batch.active = False
+
+
+@contextlib.contextmanager
+def autocommit():
+    yield
+
+
+def request_policy(policy, using=None):
+    if policy not in POLICIES:
+        raise ValueError('unknown transaction policy {!r}'.format(policy))
+    if policy == ATOMIC:
+        return atomic(using=using)
+    return autocommit()
+
+
+class TransactionPolicyMixin:
+    """
+    runs the view under its declared {transaction_policy}
+    instead of wrapping every request in ATOMIC_REQUESTS
+    """
+    transaction_policy = ATOMIC
+
+    def dispatch(self, request, *args, **kwargs):
+        with request_policy(self.transaction_policy):
+            return super().dispatch(request, *args, **kwargs)
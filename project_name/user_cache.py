@@ -0,0 +1,168 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+from .utils import random_key
+
+__all__ = ('get_user', 'invalidate', 'clear')
+
+logger = logging.getLogger(__name__)
+
+
+class LocalUserCache:
+    """
+    small per-process LRU of (version, user) items with a TTL
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        with self._lock:
+            item = self._users.get(pk)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._users[pk]
+                return None
+            self._users.move_to_end(pk)
+            return value
+
+    def set(self, pk, value):
+        with self._lock:
+            self._users[pk] = (time.monotonic() + self.ttl, value)
+            self._users.move_to_end(pk)
+            while len(self._users) > self.size:
+                self._users.popitem(last=False)
+
+    def delete(self, pk):
+        with self._lock:
+            self._users.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+_local = None
+
+
+def get_local():
+    global _local
+    if _local is None:
+        _local = LocalUserCache(settings.USER_CACHE['LOCAL_SIZE'], settings.USER_CACHE['LOCAL_TTL'])
+    return _local
+
+
+def get_shared():
+    alias = settings.USER_CACHE.get('CACHE')
+    return caches[alias] if alias else None
+
+
+def shared_key(pk):
+    return 'auth_user:{}'.format(pk)
+
+
+def version_key(pk):
+    return 'auth_user_version:{}'.format(pk)
+
+
+def get_version(shared, pk):
+    """
+    the current version of user {pk}, changed by every invalidation in any process,
+    created when missing so a user loaded afterwards is stored under it
+    """
+    key = version_key(pk)
+    version = shared.get(key)
+    if version is None:
+        shared.add(key, random_key(), None)
+        version = shared.get(key)
+    return version
+
+
+def _cached_user(shared, pk, version):
+    """
+    the cached user {pk} stored under {version}, entries stored before an invalidation don't match
+    """
+    item = get_local().get(pk)
+    if item is not None and item[0] == version:
+        return item[1]
+
+    item = shared.get(shared_key(pk))
+    if item is not None and item[0] == version:
+        get_local().set(pk, item)
+        return item[1]
+    return None
+
+
+def _store(user, version):
+    item = (version, copy.copy(user))
+    get_local().set(user.pk, item)
+    get_shared().set(shared_key(user.pk), item, settings.USER_CACHE['SHARED_TTL'])
+
+
+def get_user(request):
+    """
+    auth.get_user with a cache in front of the users table, each hit is checked against the user version
+    in the shared cache, the session hash and the backend's is_active check still run on every request,
+    without a shared cache users aren't cached since other processes couldn't invalidate them
+    """
+    shared = get_shared()
+    if shared is None:
+        return auth.get_user(request)
+
+    try:
+        pk = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    # read before the user is loaded, an invalidation in between leaves the stored user stale
+    version = get_version(shared, pk)
+    user = _cached_user(shared, pk, version)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            _store(user, version)
+        return user
+
+    backend = auth.load_backend(backend_path)
+    if hasattr(backend, 'user_can_authenticate') and not backend.user_can_authenticate(user):
+        return AnonymousUser()
+
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+
+    user = copy.copy(user)
+    user.backend = backend_path
+    return user
+
+
+def invalidate(pk):
+    get_local().delete(pk)
+    shared = get_shared()
+    if shared is not None:
+        shared.set(version_key(pk), random_key(), None)
+        shared.delete(shared_key(pk))
+
+
+def clear():
+    global _local
+    _local = None
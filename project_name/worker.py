@@ -0,0 +1,128 @@
+import logging
+import select
+import signal
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from robust.beat import BeatThread, get_scheduler
+from robust.models import unwrap_payload
+from robust.worker import Stop, WorkerLimit, WorkerThread
+
+from . import mails
+from .lanes import next_tasks
+from .tasks import mail as mail_tasks
+
+__all__ = ('LaneWorkerThread', 'run_lane_worker')
+
+logger = logging.getLogger(__name__)
+
+
+def mail_user_ids(tasks):
+    """
+    users the mail tasks among {tasks} are sent to
+    """
+    prefix = mail_tasks.__name__ + '.'
+    payloads = [unwrap_payload(task.payload) for task in tasks if task.name.startswith(prefix)]
+    return [payload['user_id'] for payload in payloads if payload.get('user_id') is not None]
+
+
+class LaneWorkerThread(WorkerThread):
+    """
+    robust worker thread taking tasks of its {lanes} only
+    """
+
+    def __init__(self, number, runner_cls, bulk, worker_limit, lanes):
+        super(LaneWorkerThread, self).__init__(number, runner_cls, bulk, worker_limit)
+        self.name = 'WorkerThread-{}[{}]'.format(number, ','.join(lanes))
+        self.lanes = lanes
+
+    def run_chunk(self):
+        """
+        runs up to {bulk} tasks of the lanes in one transaction, returns them
+        """
+        with transaction.atomic():
+            tasks = next_tasks(self.lanes, limit=self.bulk)
+            logger.debug('%s got tasks %r', self.name, tasks)
+            if self.worker_limit:
+                self.worker_limit.dec(amount=len(tasks))
+
+            # mail tasks of the chunk share one email connection and one user query
+            with mails.batch(mail_user_ids(tasks)):
+                for task in tasks:
+                    self.runner_cls(task).run()
+        return tasks
+
+    def run(self):
+        try:
+            notify_timeout = getattr(settings, 'ROBUST_NOTIFY_TIMEOUT', 10)
+            worker_failure_timeout = getattr(settings, 'ROBUST_WORKER_FAILURE_TIMEOUT', 5)
+
+            while True:
+                try:
+                    if self.should_terminate():
+                        raise Stop()
+
+                    tasks = self.run_chunk()
+
+                    if self.should_terminate():
+                        raise Stop()
+
+                    if not tasks:
+                        with connection.cursor() as cursor:
+                            cursor.execute('LISTEN robust')
+                        select.select([connection.connection], [], [], notify_timeout)
+
+                except Stop:
+                    break
+
+                except Exception:
+                    logger.error('%s exception ', self.name, exc_info=True)
+                    time.sleep(worker_failure_timeout)
+
+            logger.debug('terminating %s', self.name)
+        finally:
+            close_old_connections()
+
+
+def run_lane_worker(lanes, reserve, concurrency, bulk, limit, runner_cls, beat):
+    """
+    {reserve} maps a lane to the number of threads serving only that lane,
+    the remaining threads serve all {lanes} by priority
+    """
+    reserved = sum(reserve.values())
+    if reserved >= concurrency:
+        raise ValueError('reserved threads must leave at least one shared thread')
+
+    worker_limit = WorkerLimit(limit) if limit else None
+    threads = []
+
+    if beat:
+        threads.append(BeatThread(get_scheduler()))
+
+    for name, count in sorted(reserve.items()):
+        for _ in range(count):
+            threads.append(LaneWorkerThread(len(threads), runner_cls, bulk, worker_limit, [name]))
+    while len(threads) < concurrency + int(beat):
+        threads.append(LaneWorkerThread(len(threads), runner_cls, bulk, worker_limit, lanes))
+
+    for thread in threads:
+        thread.start()
+
+    def terminate():
+        for thread in threads:
+            thread.terminate = True
+        with connection.cursor() as cursor:
+            cursor.execute('NOTIFY robust')
+
+    def signal_handler(*_):
+        logger.warning('terminate worker')
+        terminate()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
+        if worker_limit and worker_limit.should_terminate():
+            terminate()